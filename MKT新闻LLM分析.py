@@ -150,22 +150,18 @@ def dt_from_publish(publish_time):
     return dt
     
 
-def _chunk_text(s, limit=6000):
+def _chunk_text(s, budget=None):
+    # 按翻译模型的 token 预算分段（主模型与 qwen-mt 回退模型取较小者），并为标题与分隔线留出余量
     if not s:
         return []
+    import summary_generator
+    if budget is None:
+        budget = min(
+            summary_generator.translation_budget(QWEN_MKT_TRANSLATION_MODEL),
+            summary_generator.translation_budget("qwen-mt-turbo"),
+        ) - 64
     lines = [p for p in re.split(r"\n+", s) if p]
-    chunks = []
-    cur = ""
-    for ln in lines:
-        if len(cur) + len(ln) + 1 > limit:
-            if cur:
-                chunks.append(cur)
-            cur = ln
-        else:
-            cur = (cur + "\n" + ln) if cur else ln
-    if cur:
-        chunks.append(cur)
-    return chunks
+    return summary_generator.pack_chunks(lines, max(budget, 64), model=QWEN_MKT_TRANSLATION_MODEL)
 
 def main():
     global mkt_analysis
@@ -347,32 +343,21 @@ def main():
     mkt_diary_id = (os.environ.get("MKT_DIARY_PAGE_ID") or os.environ.get("DIARY_PARENT_PAGE_ID") or "").strip()
     
     print(f"\n正在使用千问生成统一分析报告 (共 {len(collected_news)} 条新闻)...")
-    chunks = []
-    cur = "【今日A股相关重要新闻汇总】\n\n"
+    items = []
     for i, item in enumerate(collected_news):
         t_str = item['time'].strftime("%Y-%m-%d %H:%M")
-        part = f"No.{i+1} [{t_str}] {item['title']}\n{item['body']}\n{'-'*40}\n"
-        if len(cur) + len(part) > 20000:
-            chunks.append(cur)
-            cur = "【今日A股相关重要新闻汇总】\n\n" + part
-        else:
-            cur += part
-    if cur.strip():
-        chunks.append(cur)
+        items.append(f"No.{i+1} [{t_str}] {item['title']}\n{item['body']}\n{'-'*40}")
     api_key = (os.environ.get("OPENAI_API_KEY") or os.environ.get("DASHSCOPE_API_KEY") or "").strip()
     if not api_key:
         print("未找到API Key: 需设置环境变量 OPENAI_API_KEY 或 DASHSCOPE_API_KEY")
     try:
         import summary_generator
-        reports = []
-        for ctx in chunks:
-            try:
-                out = summary_generator.call_qwen_api(ctx, type="MKT")
-                if out:
-                    reports.append((out or "").strip())
-            except Exception:
-                continue
-        report = "\n\n---\n\n".join(reports) if reports else None
+        # 分段并行分析后合并为一份报告；所有分段都失败时回退到翻译汇总
+        report = summary_generator.map_reduce_summary(
+            items,
+            type="MKT",
+            header="【今日A股相关重要新闻汇总】\n\n",
+        )
     except Exception as e:
         print(f"千问生成失败: {e}")
         report = None
@@ -390,7 +375,7 @@ def main():
             import summary_generator
             parts = []
             for item in collected_news:
-                chunks = _chunk_text(item['body'], limit=6000)
+                chunks = _chunk_text(item['body'])
                 out_all = []
                 for idx, ck in enumerate(chunks or [item['body']]):
                     single = f"【{item['title']}】\n{ck}\n{'-'*30}"
@@ -0,0 +1,150 @@
+import os
+import re
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import block_compiler
+
+"""
+Markdown -> Notion 块编译的微基准：对比旧实现（每段重新编译正则）与 block_compiler
+
+用法: python benchmarks/bench_block_compiler.py [目标字符数] [重复次数]
+"""
+def make_report(target_chars):
+    """
+    构造类似快讯分析的长报告（标题、列表、粗体、链接、引用、分隔线、超长段落）
+    """
+    parts = []
+    i = 0
+    size = 0
+    while size < target_chars:
+        i += 1
+        section = (
+            f"## {i}. 板块轮动观察\n"
+            f"- **核心观点**：政策预期差带动 `半导体` 与 *算力* 方向走强，详见[公告](https://example.com/n/{i})\n"
+            f"1. 驱动逻辑：财政真金白银落地，_资金验证_ 已提前布局\n"
+            f"> 风险提示：不构成投资建议，投资需谨慎\n"
+            f"{'资金面与情绪面同步改善，龙头股启动后补涨扩散。' * 12}\n"
+            f"---\n"
+        )
+        if i % 25 == 0:
+            section += "超长段落" * 1200 + "\n"
+        parts.append(section)
+        size += len(section)
+    return "".join(parts)
+
+
+def legacy_compile(summary, title):
+    """
+    旧实现：逐段 import re 并重新编译行内正则
+    """
+    def _chunks(text, limit=1800):
+        res = []
+        i = 0
+        n = len(text)
+        while i < n:
+            res.append(text[i:i+limit])
+            i += limit
+        return res
+
+    def _append_text_block(children, t, content):
+        for c in _chunks(content):
+            if t == "divider":
+                children.append({"object": "block", "type": "divider", "divider": {}})
+            else:
+                import re
+                def _inline_rich_text(s):
+                    parts = []
+                    pattern = re.compile(r"(\[([^\]]+)\]\(([^)]+)\))|(\*\*([^\*]+)\*\*)|(`([^`]+)`)|(\*([^*]+)\*)|(_([^_]+)_)")
+                    pos = 0
+                    for m in pattern.finditer(s):
+                        start, end = m.span()
+                        if start > pos:
+                            parts.append({"type": "text", "text": {"content": s[pos:start]}})
+                        if m.group(2) and m.group(3):
+                            parts.append({"type": "text", "text": {"content": m.group(2), "link": {"url": m.group(3)}}})
+                        elif m.group(5):
+                            parts.append({"type": "text", "text": {"content": m.group(5)}, "annotations": {"bold": True}})
+                        elif m.group(7):
+                            parts.append({"type": "text", "text": {"content": m.group(7)}, "annotations": {"code": True}})
+                        elif m.group(9):
+                            parts.append({"type": "text", "text": {"content": m.group(9)}, "annotations": {"italic": True}})
+                        elif m.group(11):
+                            parts.append({"type": "text", "text": {"content": m.group(11)}, "annotations": {"italic": True}})
+                        pos = end
+                    if pos < len(s):
+                        parts.append({"type": "text", "text": {"content": s[pos:]}})
+                    return parts
+                children.append({"object": "block", "type": t, t: {"rich_text": _inline_rich_text(c)}})
+
+    def _line_block_type(p):
+        if p.startswith("### "):
+            return "heading_3", p[4:]
+        if p.startswith("## "):
+            return "heading_2", p[3:]
+        if p.startswith("# "):
+            return "heading_1", p[2:]
+        if p in ("---", "———", "___"):
+            return "divider", ""
+        if p.startswith(">"):
+            return "quote", p[1:].strip()
+        import re
+        if re.match(r"^\d+\.\s+", p):
+            return "numbered_list_item", re.sub(r"^\d+\.\s+", "", p)
+        if p.startswith("- ") or p.startswith("* ") or p.startswith("• "):
+            return "bulleted_list_item", p[2:].strip()
+        return "paragraph", p
+
+    children_all = [block_compiler.title_block(title)]
+    for line in summary.split("\n"):
+        p = line.strip()
+        if not p:
+            continue
+        t, content = _line_block_type(p)
+        _append_text_block(children_all, t, content)
+    return children_all
+
+
+def _plain_text(blocks):
+    """
+    拼接所有文本块的纯文本（旧实现会丢弃分隔线且按 1800 字符切块，只比较文字本身）
+    """
+    out = []
+    for b in blocks:
+        for part in (b.get(b["type"]) or {}).get("rich_text", []):
+            out.append(part["text"]["content"])
+    return "".join(out)
+
+
+def _bench(fn, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main():
+    target = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    repeat = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    report = make_report(target)
+    title = "快讯分析 - 2025-01-01"
+    print(f"报告长度: {len(report)} 字符，{report.count(chr(10))} 行，重复 {repeat} 次取最优")
+
+    t_legacy, legacy = _bench(lambda: legacy_compile(report, title), repeat)
+    t_new, blocks = _bench(lambda: block_compiler.compile_blocks(report, title), repeat)
+    t_batches, batches = _bench(lambda: list(block_compiler.iter_batches(block_compiler.iter_blocks(report, title))), repeat)
+
+    legacy_requests = (len(legacy) + 89) // 90
+    print(f"旧实现:           {t_legacy * 1000:8.2f} ms  ({len(legacy)} 块, 固定90块/批 -> {legacy_requests} 次请求)")
+    print(f"compile_blocks:   {t_new * 1000:8.2f} ms  ({len(blocks)} 块, 加速 {t_legacy / t_new:.2f}x)")
+    print(f"iter_batches:     {t_batches * 1000:8.2f} ms  ({len(batches)} 次请求, 最大批 {max(len(b) for b in batches)} 块)")
+    print(f"文本内容一致: {_plain_text(legacy) == _plain_text(blocks)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+import os
+import sys
+import time
+import argparse
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+sys.path.append(os.path.join(ROOT, "benchmarks"))
+
+from fake_notion_server import FakeNotionServer
+from bench_block_compiler import make_report
+
+"""
+Notion I/O 基准：在本地模拟服务上运行页面写入与导出流程，统计每一步的调用次数与耗时
+
+用法: python benchmarks/bench_notion_io.py --latency-ms 80 --chars 100000
+"""
+def main():
+    parser = argparse.ArgumentParser(description="在本地模拟 Notion API 上压测写入/导出路径")
+    parser.add_argument("--latency-ms", type=float, default=50)
+    parser.add_argument("--jitter-ms", type=float, default=0)
+    parser.add_argument("--throttle-rate", type=float, default=0.0)
+    parser.add_argument("--rate", type=float, default=50, help="客户端限速（次/秒）")
+    parser.add_argument("--chars", type=int, default=100_000)
+    args = parser.parse_args()
+
+    server = FakeNotionServer(
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        throttle_rate=args.throttle_rate,
+        retry_after=0.2,
+        seed=1,
+    ).start()
+    root = server.state.seed_page("基准父页面")
+    # 必须在导入 notion_api 之前设置
+    os.environ["NOTION_BASE_URL"] = server.url
+    os.environ["NOTION_TOKEN"] = os.environ.get("NOTION_TOKEN") or "fake-token"
+    os.environ["NOTION_RATE_LIMIT"] = str(args.rate)
+    os.environ["NOTION_BURST"] = str(max(int(args.rate), 1))
+    os.environ.setdefault("NOTION_CACHE_DIR", os.path.join(ROOT, ".cache", "bench"))
+
+    import notion_api
+    import page_writer
+    import export_today_docs
+
+    parent_id = root["id"]
+    title = "快讯分析 - 2025-01-01"
+    report = make_report(args.chars)
+    edited = report.replace("## 7. 板块轮动观察", "## 7. 板块轮动观察（修订）", 1)
+
+    def step(name, fn):
+        server.state.reset_calls()
+        start = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - start
+        counts = server.state.call_counts()
+        detail = "，".join(f"{k} {v}" for k, v in sorted(counts.items(), key=lambda kv: -kv[1]))
+        print(f"{name:<12} {elapsed:7.2f}s  {sum(counts.values()):5d} 次调用  ({detail})")
+
+    print(f"报告长度 {len(report)} 字符，模拟延迟 {args.latency_ms}ms，客户端限速 {args.rate}/s")
+    step("首次创建", lambda: page_writer.create_daily_summary(report, parent_page_id=parent_id, title_override=title))
+    step("相同内容", lambda: page_writer.create_daily_summary(report, parent_page_id=parent_id, title_override=title))
+    step("小幅修改", lambda: page_writer.create_daily_summary(edited, parent_page_id=parent_id, title_override=title))
+
+    # _export_page 会同时写入当前目录与 OUT_DIR，在临时目录中导出以免在仓库中留下文件
+    def export():
+        cwd = os.getcwd()
+        with tempfile.TemporaryDirectory() as tmp:
+            os.chdir(tmp)
+            os.environ["OUT_DIR"] = tmp
+            try:
+                export_today_docs._export_page(notion_api.get_client(), parent_id, "快讯分析", "2025-01-01", "export.md")
+            finally:
+                os.chdir(cwd)
+    step("导出", export)
+    server.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+import os
+import sys
+import json
+import shutil
+import tempfile
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+
+"""
+流式输出回归检查：本地模拟服务返回未声明字符集的 text/event-stream，内容为原始 UTF-8 中文，
+检查流式输出与写入缓存的全文均无乱码（requests 对这类响应默认按 ISO-8859-1 解码）
+
+用法: python benchmarks/check_sse_stream.py
+"""
+# 含 \u2028：str.splitlines 会在此处断行，逐行解码必须按字节分行
+DELTAS = ["贵州茅台", "涨停，成交额", "创新高\u2028（续）"]
+
+
+class _SSEHandler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.end_headers()
+        for i, text in enumerate(DELTAS):
+            finish = "stop" if i == len(DELTAS) - 1 else "null"
+            event = {"output": {"choices": [{"message": {"content": text}, "finish_reason": finish}]}}
+            self.wfile.write(f"data:{json.dumps(event, ensure_ascii=False)}\n\n".encode("utf-8"))
+
+
+def main():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _SSEHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    cache_dir = tempfile.mkdtemp(prefix="sse_check_")
+    # 必须在导入 summary_generator 之前设置
+    os.environ["NOTION_CACHE_DIR"] = cache_dir
+    os.environ["OPENAI_API_KEY"] = os.environ["DASHSCOPE_API_KEY"] = "fake-key"
+    os.environ["LLM_TRANSPORT"] = "http"
+    try:
+        import summary_generator as sg
+        sg.QWEN_GENERATION_URL = f"http://127.0.0.1:{server.server_port}/generation"
+        expected = "".join(DELTAS)
+        text = "".join(sg.stream_qwen_api("检查", use_cache=False))
+        key = sg._llm_cache_key(sg.QWEN_MODEL, None, sg._system_prompt(None, sg.QWEN_MODEL), "检查")
+        cached = sg._llm_cache_get(key)
+        print(f"流式输出: {text!r}")
+        print(f"缓存内容: {cached!r}")
+        if text != expected or cached != expected:
+            print("❌ 流式输出解码错误")
+            sys.exit(1)
+        print("✅ 未声明字符集的流式输出解码正确")
+    finally:
+        server.shutdown()
+        shutil.rmtree(cache_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,312 @@
+import io
+import re
+import json
+
+# Notion 请求限制：单个 rich_text 元素 2000 字符、单个 rich_text 数组 100 个元素、
+# 单次请求 100 个子块、请求体 500KB（留出余量给 parent/properties 等字段）
+MAX_TEXT_CONTENT = 2000
+MAX_RICH_TEXT_ITEMS = 100
+MAX_BLOCKS_PER_REQUEST = 100
+MAX_PAYLOAD_BYTES = 450_000
+# 单个块的 rich_text 序列化后的上限（为块本身的字段留出余量），保证任何一个块都能单独放进一次请求
+MAX_BLOCK_TEXT_BYTES = MAX_PAYLOAD_BYTES - 1_000
+# 超长文本优先在这些字符之后切分，避免截断词语与句子
+_BREAK_CHARS = "\n 。！？；，、.!?;,)）】」"
+
+_INLINE_PATTERN = re.compile(r"(\[([^\]]+)\]\(([^)]+)\))|(\*\*([^\*]+)\*\*)|(`([^`]+)`)|(\*([^*]+)\*)|(_([^_]+)_)")
+# 不含任何行内标记字符的文本可以跳过正则匹配
+_INLINE_MARKERS = re.compile(r"[\[*`_]")
+_NUMBERED_PATTERN = re.compile(r"^\d+\.\s+")
+# JSON 序列化时需要转义的字符；不含这些字符的字符串序列化后的字节数就是其 UTF-8 长度
+_JSON_ESCAPED = re.compile(r'["\\\x00-\x1f]')
+_ITEM_BASE_BYTES = len(json.dumps({"type": "text", "text": {"content": ""}}))
+_LINK_BASE_BYTES = len(', "link": {"url": ""}')
+_ANNOTATIONS_BASE_BYTES = len(', "annotations": ')
+_block_base_bytes = {}
+_annotations_bytes = {}
+# 快速路径的保守估计：每个字符序列化后至多 6 字节（\uXXXX 转义），每个元素的结构开销不超过 128 字节
+_MAX_CHAR_BYTES = 6
+_MAX_ITEM_OVERHEAD = 128
+_DIVIDERS = ("---", "———", "___")
+
+"""
+Markdown -> Notion 块编译器（页面创建与更新共用）
+"""
+def inline_rich_text(s):
+    """
+    将一行内的链接、粗体、代码、斜体转换为 rich_text 数组
+    """
+    if not _INLINE_MARKERS.search(s):
+        return [{"type": "text", "text": {"content": s}}] if s else []
+    parts = []
+    pos = 0
+    for m in _INLINE_PATTERN.finditer(s):
+        start, end = m.span()
+        if start > pos:
+            parts.append({"type": "text", "text": {"content": s[pos:start]}})
+        if m.group(2) and m.group(3):
+            parts.append({"type": "text", "text": {"content": m.group(2), "link": {"url": m.group(3)}}})
+        elif m.group(5):
+            parts.append({"type": "text", "text": {"content": m.group(5)}, "annotations": {"bold": True}})
+        elif m.group(7):
+            parts.append({"type": "text", "text": {"content": m.group(7)}, "annotations": {"code": True}})
+        elif m.group(9):
+            parts.append({"type": "text", "text": {"content": m.group(9)}, "annotations": {"italic": True}})
+        elif m.group(11):
+            parts.append({"type": "text", "text": {"content": m.group(11)}, "annotations": {"italic": True}})
+        pos = end
+    if pos < len(s):
+        parts.append({"type": "text", "text": {"content": s[pos:]}})
+    return parts
+
+
+def line_block_type(p):
+    """
+    根据行首标记判断块类型，返回 (块类型, 去掉标记后的文本)
+    """
+    if p.startswith("### "):
+        return "heading_3", p[4:]
+    if p.startswith("## "):
+        return "heading_2", p[3:]
+    if p.startswith("# "):
+        return "heading_1", p[2:]
+    if p in _DIVIDERS:
+        return "divider", ""
+    if p.startswith(">"):
+        return "quote", p[1:].strip()
+    m = _NUMBERED_PATTERN.match(p)
+    if m:
+        return "numbered_list_item", p[m.end():]
+    if p.startswith("- ") or p.startswith("* ") or p.startswith("• "):
+        return "bulleted_list_item", p[2:].strip()
+    return "paragraph", p
+
+
+def title_block(title):
+    return {
+        "object": "block",
+        "type": "heading_1",
+        "heading_1": {"rich_text": [{"type": "text", "text": {"content": title}}]},
+    }
+
+
+def split_text(s, limit=MAX_TEXT_CONTENT):
+    """
+    将超长文本切分为不超过 limit 的片段，优先在空白或标点之后断开
+    """
+    pieces = []
+    while len(s) > limit:
+        cut = max(s.rfind(c, limit // 2, limit) for c in _BREAK_CHARS) + 1
+        if cut <= 0:
+            cut = limit
+        pieces.append(s[:cut])
+        s = s[cut:]
+    if s:
+        pieces.append(s)
+    return pieces
+
+
+def _split_rich_text(parts):
+    """
+    在行内解析之后再切分超长的 rich_text 元素，链接与样式随每个片段保留
+    """
+    out = []
+    for part in parts:
+        content = part["text"]["content"]
+        if len(content) <= MAX_TEXT_CONTENT:
+            out.append(part)
+            continue
+        for piece in split_text(content):
+            item = dict(part)
+            item["text"] = dict(part["text"], content=piece)
+            out.append(item)
+    return out
+
+
+class _SizedBlock(dict):
+    """
+    编译时已知序列化字节数的块（与普通 dict 一样序列化），iter_batches 无需再次序列化
+    """
+    __slots__ = ("size",)
+
+
+def _json_str_bytes(s):
+    """
+    字符串按 JSON（ensure_ascii=False）序列化后引号内的字节数
+    """
+    if _JSON_ESCAPED.search(s):
+        return len(json.dumps(s, ensure_ascii=False).encode("utf-8")) - 2
+    return len(s.encode("utf-8"))
+
+
+def _item_size(item):
+    """
+    单个 rich_text 元素序列化后的字节数（按结构计算，不序列化整个元素）
+    """
+    text = item["text"]
+    n = _ITEM_BASE_BYTES + _json_str_bytes(text["content"])
+    link = text.get("link")
+    if link:
+        n += _LINK_BASE_BYTES + _json_str_bytes(link["url"])
+    annotations = item.get("annotations")
+    if annotations:
+        key = tuple(annotations.items())
+        size = _annotations_bytes.get(key)
+        if size is None:
+            size = _annotations_bytes[key] = len(json.dumps(annotations))
+        n += _ANNOTATIONS_BASE_BYTES + size
+    return n
+
+
+def _batch_size(block):
+    """
+    iter_batches 使用的块字节数：优先使用编译时已知的大小，纯 rich_text 块按结构计算，其他块序列化
+    """
+    size = getattr(block, "size", None)
+    if size is not None:
+        return size
+    t = block.get("type")
+    data = block.get(t)
+    if len(block) == 3 and isinstance(data, dict) and len(data) == 1 and "rich_text" in data:
+        items = data["rich_text"]
+        if all(item.get("type") == "text" and len(item) <= 3 for item in items):
+            return _block_base_size(t) + sum(_item_size(item) + 2 for item in items) - (2 if items else 0)
+    return block_size(block)
+
+
+def _block_base_size(t):
+    """
+    rich_text 为空时块序列化后的字节数
+    """
+    n = _block_base_bytes.get(t)
+    if n is None:
+        n = _block_base_bytes[t] = block_size({"object": "block", "type": t, t: {"rich_text": []}})
+    return n
+
+
+def _sized_blocks(t, rich_text):
+    """
+    按元素个数（MAX_RICH_TEXT_ITEMS）与字节数（MAX_BLOCK_TEXT_BYTES）把 rich_text 分到同类型的块中，
+    分组时累加的字节数同时作为块的序列化大小
+    """
+    group = []
+    size = 0
+    for item in rich_text:
+        n = _item_size(item) + 2
+        if group and (len(group) >= MAX_RICH_TEXT_ITEMS or size + n > MAX_BLOCK_TEXT_BYTES):
+            yield _sized_block(t, group, size)
+            group = []
+            size = 0
+        group.append(item)
+        size += n
+    if group:
+        yield _sized_block(t, group, size)
+
+
+def _sized_block(t, group, size):
+    block = _SizedBlock({"object": "block", "type": t, t: {"rich_text": group}})
+    # 每个元素之后按 ", " 计了 2 字节，最后一个元素没有分隔符
+    block.size = _block_base_size(t) + size - 2
+    return block
+
+
+def line_blocks(line):
+    """
+    编译单行文本；一行只在 rich_text 超过 MAX_RICH_TEXT_ITEMS 个元素或 MAX_BLOCK_TEXT_BYTES 字节时
+    才拆成多个同类型块
+    """
+    p = line.strip()
+    if not p:
+        return
+    t, content = line_block_type(p)
+    if t == "divider":
+        yield {"object": "block", "type": "divider", "divider": {}}
+        return
+    rich_text = _split_rich_text(inline_rich_text(content))
+    # 快速路径：按最坏情况估计也远小于上限的行直接成块，字节数留到装箱时再计算
+    if len(rich_text) <= MAX_RICH_TEXT_ITEMS and \
+            len(content) * _MAX_CHAR_BYTES + len(rich_text) * _MAX_ITEM_OVERHEAD <= MAX_BLOCK_TEXT_BYTES:
+        yield {"object": "block", "type": t, t: {"rich_text": rich_text}}
+        return
+    yield from _sized_blocks(t, rich_text)
+
+
+def iter_blocks(markdown, title=None):
+    """
+    单次流式遍历 markdown，逐个产出 Notion 块
+
+    Args:
+        markdown: 要编译的文本
+        title: 可选，作为首个 heading_1 块
+    """
+    if title:
+        yield title_block(title)
+    for line in io.StringIO(markdown or ""):
+        yield from line_blocks(line)
+
+
+def iter_stream_blocks(chunks, title=None):
+    """
+    增量编译：文本片段（如模型的流式输出）逐个到达，每凑齐完整的一行就产出对应的块
+    
+    产出的块与对完整文本调用 iter_blocks 的结果一致。
+    
+    Args:
+        chunks: 文本片段序列（可为生成器）
+        title: 可选，作为首个 heading_1 块
+    """
+    if title:
+        yield title_block(title)
+    buffer = ""
+    for chunk in chunks:
+        if not chunk:
+            continue
+        buffer += chunk
+        if "\n" not in chunk:
+            continue
+        lines = buffer.split("\n")
+        buffer = lines.pop()
+        for line in lines:
+            yield from line_blocks(line)
+    if buffer:
+        yield from line_blocks(buffer)
+
+
+def block_size(block):
+    """
+    块序列化为 JSON 后的字节数
+    """
+    return len(json.dumps(block, ensure_ascii=False).encode("utf-8"))
+
+
+def iter_batches(blocks, max_blocks=MAX_BLOCKS_PER_REQUEST, max_bytes=MAX_PAYLOAD_BYTES):
+    """
+    按块数与请求体大小装箱，每批尽量接近 Notion 的单次请求上限
+
+    Args:
+        blocks: 块序列（可为生成器）
+        max_blocks: 每批最多块数
+        max_bytes: 每批 children 序列化后的最大字节数
+
+    Yields:
+        list: 可直接作为 children 参数的块列表
+    """
+    batch = []
+    size = 0
+    for block in blocks:
+        n = _batch_size(block) + 1
+        if batch and (len(batch) >= max_blocks or size + n > max_bytes):
+            yield batch
+            batch = []
+            size = 0
+        batch.append(block)
+        size += n
+    if batch:
+        yield batch
+
+
+def compile_blocks(markdown, title=None):
+    """
+    编译为完整的块列表
+    """
+    return list(iter_blocks(markdown, title))
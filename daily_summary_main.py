@@ -1,6 +1,8 @@
 import os
 import sys
+import time
 import importlib.util
+import concurrent.futures
 
 # 添加当前目录到Python路径
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
@@ -9,6 +11,10 @@ sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 import idea_retriever
 import summary_generator
 import page_writer
+import notion_api
+
+# 并发处理市场分析来源页面（读取正文 + AI分析）的线程数
+MARKET_PAGE_WORKERS = int(os.environ.get("MARKET_PAGE_WORKERS") or 4)
 
 def load_module(module_name, filename):
     base = os.path.dirname(os.path.abspath(__file__))
@@ -156,6 +162,68 @@ class DailySummaryRunner:
         if missing_vars:
             raise ValueError(f"缺少必要的环境变量: {', '.join(missing_vars)}")
     
+    @staticmethod
+    def _analyze_market_page(page):
+        """
+        读取单个来源页面并生成市场分析（在线程池中执行，不写入Notion）
+        
+        Returns:
+            dict: {"title", "analysis", "error", "elapsed"}
+        """
+        start = time.time()
+        title = idea_retriever.get_idea_title(page)
+        result = {"title": title, "analysis": None, "error": None, "elapsed": 0.0}
+        try:
+            content = idea_retriever.get_idea_content(page)
+            if not content:
+                result["error"] = "页面内容为空，跳过"
+            else:
+                # AI分析
+                result["analysis"] = summary_generator.call_qwen_api(content)
+                if not result["analysis"]:
+                    result["error"] = "AI分析结果为空"
+        except Exception as e:
+            result["error"] = f"处理页面失败: {e}"
+        result["elapsed"] = time.time() - start
+        return result
+    
+    def process_market_pages(self, pages, max_workers=None):
+        """
+        并发处理市场分析来源页面
+        
+        读取正文与AI分析在线程池中并行执行；所有页面写入同一个“市场分析”页面，
+        因此写入由当前线程按来源页面顺序依次执行，结果与逐个处理时一致。
+        单个页面失败不影响其他页面。
+        
+        Args:
+            pages: scan_idea_source 返回的页面对象列表
+            max_workers: 并发数，默认 MARKET_PAGE_WORKERS
+        
+        Returns:
+            list: 与输入顺序一致的每页结果 {"title", "ok", "page_id", "error", "elapsed"}
+        """
+        workers = max(1, min(int(max_workers or MARKET_PAGE_WORKERS), len(pages) or 1))
+        results = []
+        with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(self._analyze_market_page, page) for page in pages]
+            for future in futures:
+                r = future.result()
+                item = {"title": r["title"], "ok": False, "page_id": None, "error": r["error"], "elapsed": r["elapsed"]}
+                if r["analysis"]:
+                    try:
+                        item["page_id"] = page_writer.create_market_analysis(r["analysis"])
+                        item["ok"] = True
+                    except Exception as e:
+                        item["error"] = f"写入失败: {e}"
+                results.append(item)
+                if item["ok"]:
+                    print(f"   ✅ {item['title']}：市场分析已写入，页面ID: {item['page_id']}（{item['elapsed']:.1f}s）")
+                else:
+                    print(f"   ⚠️ {item['title']}：{item['error']}")
+        ok = sum(1 for item in results if item["ok"])
+        print(f"✅ 市场分析页面处理完成：成功 {ok} 个，失败或跳过 {len(results) - ok} 个")
+        return results
+    
     def run(self):
         """
         执行每日总结流程
@@ -174,35 +242,28 @@ class DailySummaryRunner:
             # 处理独立页面（市场分析）
             if pages:
                 print(f"✅ 发现 {len(pages)} 个市场分析页面，开始处理...")
-                for page in pages:
-                    try:
-                        title = idea_retriever.get_idea_title(page)
-                        print(f"   正在分析页面: {title}")
-                        content = idea_retriever.get_idea_content(page)
-                        if not content:
-                            print("   ⚠️ 页面内容为空，跳过")
-                            continue
-                            
-                        # AI分析
-                        analysis = summary_generator.call_qwen_api(content)
-                        if analysis:
-                            pid = page_writer.create_market_analysis(analysis)
-                            print(f"   ✅ 市场分析已写入，页面ID: {pid}")
-                        else:
-                            print("   ⚠️ AI分析结果为空")
-                    except Exception as e:
-                        print(f"   ❌ 处理页面失败: {e}")
+                self.process_market_pages(pages)
+                idea_retriever.save_content_cache()
             
-            # 处理数据库想法
+            # 处理数据库想法：分页查询的同时并发获取每个想法的正文
             ideas = []
+            idea_texts = []
+            
+            def _collect(source):
+                for idea in source:
+                    ideas.append(idea)
+                    yield idea
+            
             if db_id:
                 print(f"✅ 正在查询想法数据库: {db_id}")
-                ideas = idea_retriever.query_idea_database(specific_db_id=db_id)
+                idea_texts = idea_retriever.fetch_idea_texts(_collect(idea_retriever.iter_idea_database(specific_db_id=db_id)))
             else:
                 # 尝试使用默认逻辑（兼容旧行为）
                 try:
-                    ideas = idea_retriever.query_idea_database()
+                    idea_texts = idea_retriever.fetch_idea_texts(_collect(idea_retriever.iter_idea_database()))
                 except Exception:
+                    ideas.clear()
+                    idea_texts = []
                     print("⚠️ 未发现想法数据库")
             
             if not ideas:
@@ -218,8 +279,13 @@ class DailySummaryRunner:
             
             existing_page = page_writer.find_page_by_title(page_writer.DIARY_PARENT_PAGE_ID, title)
             existing_content = ""
+            resumed_summary = None
             
-            if existing_page:
+            if existing_page and page_writer.write_incomplete(existing_page.get("id")):
+                # 上次写入中断：页面上只有部分内容，不能作为现有总结；有日志中的总结全文时直接续写
+                resumed_summary = page_writer.pending_summary(existing_page.get("id"), title)
+                print("\n📄 发现上次未写完的今日总结页面，" + ("将续写日志中的总结" if resumed_summary else "将重新生成"))
+            elif existing_page:
                 # 如果存在，获取现有页面内容
                 print("\n📄 发现已存在今日总结页面，正在获取现有内容...")
                 existing_content = page_writer.get_page_content(existing_page.get("id"))
@@ -228,22 +294,8 @@ class DailySummaryRunner:
                     print("✅ 成功获取现有页面内容")
             
             # 4. 生成总结（如果有现有内容，会整合新旧数据）
-            print("\n🤖 正在调用千问API生成总结...")
-            
-            # 收集所有想法的内容
-            idea_texts = []
-            for idea in ideas:
-                title = idea_retriever.get_idea_title(idea)
-                description = idea_retriever.get_idea_description(idea)
-                content = idea_retriever.get_idea_content(idea)
-                
-                idea_text = f"标题：{title}"
-                if description:
-                    idea_text += f"\n描述：{description}"
-                if content:
-                    idea_text += f"\n内容：{content}"
-                
-                idea_texts.append(idea_text)
+            if not resumed_summary:
+                print("\n🤖 正在调用千问API生成总结...")
             
             # 合并所有想法内容
             full_text = "\n---\n".join(idea_texts)
@@ -253,17 +305,30 @@ class DailySummaryRunner:
                 print("🔄 正在整合新旧数据...")
                 full_text = f"# 现有总结\n{existing_content}\n\n# 新获取的想法\n{full_text}"
             
-            summary = ""
-            try:
-                summary = summary_generator.call_qwen_api(full_text).strip()
-            except Exception:
-                summary = ""
-            if not summary:
-                summary = summary_generator.generate_summary(ideas, idea_retriever)
-            
-            # 5. 创建或更新每日总结页面
-            print("\n📝 正在创建或更新每日总结页面...")
-            page_id = page_writer.create_daily_summary(summary, existing_content)
+            summary = resumed_summary or ""
+            page_id = None
+            if summary:
+                print("\n📝 正在续写每日总结页面...")
+                page_id = page_writer.create_daily_summary(summary)
+            # 单次调用即可完成时，边生成边写入页面；失败时回退到非流式生成与写入
+            elif summary_generator.LLM_STREAM and summary_generator.fits_single_call(full_text):
+                try:
+                    page_id, summary = page_writer.stream_daily_summary(summary_generator.stream_qwen_api(full_text))
+                except Exception as e:
+                    print(f"⚠️ 流式生成写入失败，改用普通方式: {e}")
+                    page_id, summary = None, ""
+            if not page_id:
+                try:
+                    # 未超出 token 预算时即为单次调用；超出时分段分析后合并
+                    summary = (summary_generator.map_reduce_summary([full_text]) or "").strip()
+                except Exception:
+                    summary = ""
+                if not summary:
+                    summary = summary_generator.generate_summary(ideas, idea_retriever)
+                
+                # 5. 创建或更新每日总结页面
+                print("\n📝 正在创建或更新每日总结页面...")
+                page_id = page_writer.create_daily_summary(summary, existing_content)
             
             print(f"\n🎉 每日总结生成完成！页面ID: {page_id}")
             print("\n✅ 正在更新看板状态为完成...")
@@ -310,3 +375,5 @@ if __name__ == "__main__":
             runner.run()
         except Exception as e:
             print(f"❌ 每日总结执行失败: {e}")
+
+    print(notion_api.format_call_stats())
@@ -1,7 +1,7 @@
 import os
 import sys
 from datetime import datetime, timedelta
-from notion_client import Client
+import notion_api
 import argparse
 
 def _rt_to_md(rich_text):
@@ -40,6 +40,10 @@ def _block_to_md(block):
         return "- " + _rt_to_md(data.get("rich_text", []))
     if t == "divider":
         return "---"
+    if t == "toggle":
+        return "- " + _rt_to_md(data.get("rich_text", []))
+    if t == "callout":
+        return "> " + _rt_to_md(data.get("rich_text", []))
     if t == "to_do":
         checked = data.get("checked", False)
         box = "x" if checked else " "
@@ -54,18 +58,19 @@ def _block_to_md(block):
     return ""
 
 def _fetch_blocks(notion, page_id):
-    items = []
-    cursor = None
-    while True:
-        if cursor:
-            resp = notion.blocks.children.list(block_id=page_id, start_cursor=cursor)
-        else:
-            resp = notion.blocks.children.list(block_id=page_id)
-        items.extend(resp.get("results", []))
-        if not resp.get("has_more"):
-            break
-        cursor = resp.get("next_cursor")
-    return items
+    # 仅一级子块（用于判断页面首个标题）
+    return notion_api.list_children(page_id, client=notion)
+
+def _tree_to_md(notion, page_id):
+    # 完整块树（折叠块、嵌套列表）按文档顺序导出，嵌套内容缩进两个空格
+    lines = []
+    for depth, b in notion_api.iter_block_tree(page_id, client=notion):
+        md = _block_to_md(b).strip()
+        if not md:
+            continue
+        indent = "  " * depth
+        lines.append("\n".join(indent + part for part in md.split("\n")))
+    return "\n".join(lines)
 
 def _find_child_page_id(notion, parent_id, title_exact, date_str, base):
     items = []
@@ -162,13 +167,7 @@ def _export_page(notion, parent_id, base, date_str, filename):
                     continue
             if not page_id:
                 return False, f"未找到页面: {title}"
-    blocks = _fetch_blocks(notion, page_id)
-    lines = []
-    for b in blocks:
-        line = _block_to_md(b).strip()
-        if line:
-            lines.append(line)
-    content = "\n".join(lines)
+    content = _tree_to_md(notion, page_id)
     out_dir = os.environ.get("OUT_DIR") or "."
     try:
         os.makedirs(out_dir, exist_ok=True)
@@ -240,7 +239,7 @@ def main():
     if not token:
         print("NOTION_TOKEN 未设置")
         return
-    notion = Client(auth=token)
+    notion = notion_api.get_client(token)
 
     if args.date:
         date_candidates = [args.date.strip()]
@@ -289,6 +288,7 @@ def main():
                         print(f"- {tt}")
                 else:
                     print(f"{base_name} 父页面下未能列出子页面（可能无权限或无子页面）")
+    print(notion_api.format_call_stats())
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,687 @@
+import re
+import sys
+import json
+import time
+import uuid
+import random
+import argparse
+import threading
+from datetime import datetime, timezone
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+"""
+本地模拟 Notion API：内存状态、可配置延迟与 429 注入、记录每次调用
+
+用法：
+    python fake_notion_server.py --port 8765 --latency-ms 80 --throttle-rate 0.05
+    set NOTION_BASE_URL=http://127.0.0.1:8765
+"""
+_ANNOTATION_DEFAULTS = {
+    "bold": False,
+    "italic": False,
+    "strikethrough": False,
+    "underline": False,
+    "code": False,
+    "color": "default",
+}
+
+
+def _now_iso():
+    return datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%f")[:-3] + "Z"
+
+
+def _new_id():
+    return str(uuid.uuid4())
+
+
+def _norm_id(object_id):
+    return (object_id or "").replace("-", "")
+
+
+def _normalize_rich_text(items):
+    """
+    补全 rich_text 的 plain_text/href/annotations，与真实 API 返回一致
+    """
+    out = []
+    for item in items or []:
+        text = dict(item.get("text") or {})
+        content = text.get("content", item.get("plain_text", ""))
+        text["content"] = content
+        text.setdefault("link", None)
+        ann = dict(_ANNOTATION_DEFAULTS)
+        ann.update(item.get("annotations") or {})
+        out.append({
+            "type": "text",
+            "text": text,
+            "annotations": ann,
+            "plain_text": content,
+            "href": (text.get("link") or {}).get("url"),
+        })
+    return out
+
+
+def _plain(items):
+    return "".join(i.get("plain_text") or (i.get("text") or {}).get("content", "") for i in items or [])
+
+
+class FakeNotionError(Exception):
+    def __init__(self, status, code, message):
+        super().__init__(message)
+        self.status = status
+        self.code = code
+        self.message = message
+
+
+class FakeNotionState:
+    """
+    内存中的工作区：页面、块、数据库及调用记录
+    """
+
+    def __init__(self, latency_ms=0, jitter_ms=0, throttle_rate=0.0, throttle_every=0,
+                 retry_after=1, rate_limit=0.0, seed=None):
+        self.lock = threading.RLock()
+        self.pages = {}
+        self.blocks = {}
+        self.children = {}
+        self.databases = {}
+        self.calls = []
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.throttle_rate = throttle_rate
+        self.throttle_every = throttle_every
+        self.retry_after = retry_after
+        self.rate_limit = rate_limit
+        self._rng = random.Random(seed)
+        self._window = []
+
+    def _find(self, table, object_id, kind):
+        obj = table.get(_norm_id(object_id))
+        if obj is None:
+            raise FakeNotionError(404, "object_not_found", f"Could not find {kind} with ID: {object_id}.")
+        return obj
+
+    def _touch(self, obj):
+        obj["last_edited_time"] = _now_iso()
+
+    # ---- 构造数据 ----
+    def seed_page(self, title, parent_id=None):
+        """
+        创建页面（parent_id 为空时作为工作区顶层页面）
+        """
+        parent = {"type": "page_id", "page_id": parent_id} if parent_id else {"type": "workspace", "workspace": True}
+        return self.create_page({
+            "parent": parent,
+            "properties": {"title": [{"type": "text", "text": {"content": title}}]},
+        })
+
+    def seed_database(self, parent_page_id, title, properties):
+        """
+        在页面下创建数据库
+
+        Args:
+            properties: {名称: {"type": ..., <type>: 配置}}，例如 {"状态": {"type": "status", "status": {"options": [{"name": "未开始"}]}}}
+        """
+        with self.lock:
+            db_id = _new_id()
+            props = {}
+            for i, (name, prop) in enumerate(properties.items()):
+                t = prop.get("type")
+                props[name] = {
+                    "id": "title" if t == "title" else f"p{i}",
+                    "name": name,
+                    "type": t,
+                    t: prop.get(t, {}),
+                }
+            now = _now_iso()
+            db = {
+                "object": "database",
+                "id": db_id,
+                "created_time": now,
+                "last_edited_time": now,
+                "title": _normalize_rich_text([{"text": {"content": title}}]),
+                "parent": {"type": "page_id", "page_id": parent_page_id},
+                "properties": props,
+                "archived": False,
+                "in_trash": False,
+            }
+            self.databases[_norm_id(db_id)] = db
+            self._add_child_block(parent_page_id, {"type": "child_database", "child_database": {"title": title}}, db_id)
+            return db
+
+    def seed_row(self, database_id, properties, content=None):
+        """
+        在数据库中创建一行；content 为可选的正文段落列表
+        """
+        children = [
+            {"object": "block", "type": "paragraph", "paragraph": {"rich_text": [{"type": "text", "text": {"content": c}}]}}
+            for c in content or []
+        ]
+        return self.create_page({
+            "parent": {"type": "database_id", "database_id": database_id},
+            "properties": properties,
+            "children": children,
+        })
+
+    # ---- 页面 ----
+    def _normalize_properties(self, parent, properties):
+        schema = {}
+        if parent.get("database_id"):
+            schema = self._find(self.databases, parent["database_id"], "database")["properties"]
+        out = {}
+        for name, value in (properties or {}).items():
+            if isinstance(value, list):
+                value = {"title": value}
+            definition = schema.get(name) or {}
+            t = definition.get("type") or next((k for k in value if k not in ("id", "type")), "title")
+            v = value.get(t)
+            if t in ("title", "rich_text"):
+                v = _normalize_rich_text(v)
+            out[name] = {"id": definition.get("id") or ("title" if t == "title" else name), "type": t, t: v}
+        return out
+
+    def create_page(self, body):
+        with self.lock:
+            parent = dict(body.get("parent") or {})
+            if parent.get("page_id"):
+                parent["type"] = "page_id"
+                self._find(self.pages, parent["page_id"], "page")
+            elif parent.get("database_id"):
+                parent["type"] = "database_id"
+            page_id = _new_id()
+            now = _now_iso()
+            page = {
+                "object": "page",
+                "id": page_id,
+                "created_time": now,
+                "last_edited_time": now,
+                "archived": False,
+                "in_trash": False,
+                "parent": parent,
+                "properties": self._normalize_properties(parent, body.get("properties")),
+                "url": f"https://www.notion.so/{_norm_id(page_id)}",
+            }
+            self.pages[_norm_id(page_id)] = page
+            self.children[_norm_id(page_id)] = []
+            if parent.get("page_id"):
+                title = ""
+                for prop in page["properties"].values():
+                    if prop["type"] == "title":
+                        title = _plain(prop["title"])
+                self._add_child_block(parent["page_id"], {"type": "child_page", "child_page": {"title": title}}, page_id)
+            self._append_children(page_id, body.get("children") or [], None)
+            return page
+
+    def retrieve_page(self, page_id):
+        with self.lock:
+            return self._find(self.pages, page_id, "page")
+
+    def update_page(self, page_id, body):
+        with self.lock:
+            page = self._find(self.pages, page_id, "page")
+            if page.get("archived") and body.get("archived") is not False and "properties" in body:
+                raise FakeNotionError(400, "validation_error",
+                                      "Can't edit block that is archived. You must unarchive the block before editing.")
+            if "properties" in body:
+                page["properties"].update(self._normalize_properties(page["parent"], body["properties"]))
+                block = self.blocks.get(_norm_id(page_id))
+                if block and block["type"] == "child_page":
+                    for prop in page["properties"].values():
+                        if prop["type"] == "title":
+                            block["child_page"]["title"] = _plain(prop["title"])
+            for flag in ("archived", "in_trash"):
+                if flag in body:
+                    page["archived"] = page["in_trash"] = bool(body[flag])
+                    block = self.blocks.get(_norm_id(page_id))
+                    if block:
+                        block["archived"] = block["in_trash"] = bool(body[flag])
+            self._touch(page)
+            return page
+
+    # ---- 块 ----
+    def _add_child_block(self, parent_id, data, block_id):
+        now = _now_iso()
+        block = {
+            "object": "block",
+            "id": block_id,
+            "parent": {"type": "page_id", "page_id": parent_id},
+            "created_time": now,
+            "last_edited_time": now,
+            "has_children": False,
+            "archived": False,
+            "in_trash": False,
+        }
+        block.update(data)
+        self.blocks[_norm_id(block_id)] = block
+        self.children.setdefault(_norm_id(parent_id), []).append(_norm_id(block_id))
+        return block
+
+    def _make_block(self, parent_id, child):
+        t = child.get("type")
+        data = dict(child.get(t) or {})
+        if "rich_text" in data:
+            data["rich_text"] = _normalize_rich_text(data["rich_text"])
+        now = _now_iso()
+        block_id = _new_id()
+        block = {
+            "object": "block",
+            "id": block_id,
+            "parent": {"type": "block_id", "block_id": parent_id},
+            "created_time": now,
+            "last_edited_time": now,
+            "has_children": False,
+            "archived": False,
+            "in_trash": False,
+            "type": t,
+            t: data,
+        }
+        self.blocks[_norm_id(block_id)] = block
+        self.children[_norm_id(block_id)] = []
+        nested = data.pop("children", None)
+        if nested:
+            self._append_children(block_id, nested, None)
+        return block
+
+    def _append_children(self, parent_id, children, after):
+        if len(children) > 100:
+            raise FakeNotionError(400, "validation_error", "body.children.length should be ≤ `100`.")
+        key = _norm_id(parent_id)
+        ids = self.children.setdefault(key, [])
+        pos = len(ids)
+        if after:
+            if _norm_id(after) not in ids:
+                raise FakeNotionError(400, "validation_error", f"Block {after} is not a child of {parent_id}.")
+            pos = ids.index(_norm_id(after)) + 1
+        created = [self._make_block(parent_id, c) for c in children]
+        ids[pos:pos] = [_norm_id(b["id"]) for b in created]
+        parent_block = self.blocks.get(key)
+        if parent_block and created:
+            parent_block["has_children"] = True
+        return created
+
+    def append_children(self, block_id, body):
+        with self.lock:
+            if _norm_id(block_id) not in self.children:
+                raise FakeNotionError(404, "object_not_found", f"Could not find block with ID: {block_id}.")
+            created = self._append_children(block_id, body.get("children") or [], body.get("after"))
+            return {"object": "list", "results": created, "next_cursor": None, "has_more": False}
+
+    def list_children(self, block_id, start_cursor=None, page_size=100):
+        with self.lock:
+            key = _norm_id(block_id)
+            if key not in self.children:
+                raise FakeNotionError(404, "object_not_found", f"Could not find block with ID: {block_id}.")
+            ids = [i for i in self.children[key] if not self.blocks[i].get("archived")]
+            start = 0
+            if start_cursor:
+                start = ids.index(_norm_id(start_cursor)) if _norm_id(start_cursor) in ids else len(ids)
+            page_size = min(int(page_size or 100), 100)
+            chunk = ids[start:start + page_size]
+            has_more = start + page_size < len(ids)
+            return {
+                "object": "list",
+                "results": [self.blocks[i] for i in chunk],
+                "next_cursor": self.blocks[ids[start + page_size]]["id"] if has_more else None,
+                "has_more": has_more,
+            }
+
+    def retrieve_block(self, block_id):
+        with self.lock:
+            return self._find(self.blocks, block_id, "block")
+
+    def update_block(self, block_id, body):
+        with self.lock:
+            block = self._find(self.blocks, block_id, "block")
+            t = block["type"]
+            if t in body:
+                data = dict(body[t] or {})
+                if "rich_text" in data:
+                    data["rich_text"] = _normalize_rich_text(data["rich_text"])
+                block[t].update(data)
+            for flag in ("archived", "in_trash"):
+                if flag in body:
+                    block["archived"] = block["in_trash"] = bool(body[flag])
+            self._touch(block)
+            return block
+
+    def delete_block(self, block_id):
+        with self.lock:
+            block = self._find(self.blocks, block_id, "block")
+            block["archived"] = block["in_trash"] = True
+            if block["type"] == "child_page" and _norm_id(block_id) in self.pages:
+                self.pages[_norm_id(block_id)]["archived"] = True
+            self._touch(block)
+            return block
+
+    # ---- 数据库 ----
+    def retrieve_database(self, database_id):
+        with self.lock:
+            return self._find(self.databases, database_id, "database")
+
+    def _match(self, page, flt):
+        if not flt:
+            return True
+        if "and" in flt:
+            return all(self._match(page, f) for f in flt["and"])
+        if "or" in flt:
+            return any(self._match(page, f) for f in flt["or"])
+        if "timestamp" in flt:
+            ts = flt["timestamp"]
+            cond = flt.get(ts) or {}
+            value = page.get(ts, "")
+            for op, target in cond.items():
+                if op == "on_or_after" and not value >= target:
+                    return False
+                if op == "after" and not value > target:
+                    return False
+                if op == "before" and not value < target:
+                    return False
+                if op == "on_or_before" and not value <= target:
+                    return False
+            return True
+        prop = page["properties"].get(flt.get("property"))
+        if prop is None:
+            raise FakeNotionError(400, "validation_error", f"Could not find property with name or id: {flt.get('property')}")
+        t = prop["type"]
+        cond = flt.get(t)
+        if cond is None:
+            raise FakeNotionError(400, "validation_error", f"Property type mismatch for {flt.get('property')}")
+        if t in ("status", "select"):
+            name = (prop.get(t) or {}).get("name")
+            if "equals" in cond and name != cond["equals"]:
+                return False
+            if "does_not_equal" in cond and name == cond["does_not_equal"]:
+                return False
+            return True
+        if t in ("title", "rich_text"):
+            text = _plain(prop.get(t))
+            if "contains" in cond and cond["contains"] not in text:
+                return False
+            if "equals" in cond and text != cond["equals"]:
+                return False
+            return True
+        return True
+
+    def query_database(self, database_id, body, filter_properties=None):
+        with self.lock:
+            db = self._find(self.databases, database_id, "database")
+            rows = [
+                p for p in self.pages.values()
+                if _norm_id((p.get("parent") or {}).get("database_id")) == _norm_id(db["id"]) and not p.get("archived")
+            ]
+            rows = [p for p in rows if self._match(p, body.get("filter"))]
+            for sort in reversed(body.get("sorts") or []):
+                key = sort.get("timestamp")
+                if key:
+                    rows.sort(key=lambda p: p.get(key, ""), reverse=sort.get("direction") == "descending")
+            results = self._paginate(rows, body.get("start_cursor"), body.get("page_size"))
+            if filter_properties:
+                wanted = set(filter_properties)
+                trimmed = []
+                for p in results["results"]:
+                    p = dict(p)
+                    p["properties"] = {k: v for k, v in p["properties"].items() if v.get("id") in wanted or k in wanted}
+                    trimmed.append(p)
+                results["results"] = trimmed
+            return results
+
+    def _paginate(self, items, start_cursor, page_size):
+        page_size = min(int(page_size or 100), 100)
+        start = int(start_cursor or 0)
+        chunk = items[start:start + page_size]
+        has_more = start + page_size < len(items)
+        return {
+            "object": "list",
+            "results": chunk,
+            "next_cursor": str(start + page_size) if has_more else None,
+            "has_more": has_more,
+        }
+
+    def search(self, body):
+        with self.lock:
+            query = body.get("query") or ""
+            kind = ((body.get("filter") or {}).get("value")) or None
+            items = []
+            if kind in (None, "page"):
+                for p in self.pages.values():
+                    if p.get("archived"):
+                        continue
+                    title = ""
+                    for prop in p["properties"].values():
+                        if prop["type"] == "title":
+                            title = _plain(prop["title"])
+                    if query in title:
+                        items.append(p)
+            if kind in (None, "database"):
+                items.extend(d for d in self.databases.values() if query in _plain(d["title"]))
+            items.sort(key=lambda o: o.get("last_edited_time", ""), reverse=True)
+            return self._paginate(items, body.get("start_cursor"), body.get("page_size"))
+
+    # ---- 调用记录与故障注入 ----
+    def record(self, method, path, status, duration):
+        with self.lock:
+            self.calls.append({
+                "method": method,
+                "path": path,
+                "endpoint": _endpoint(method, path),
+                "status": status,
+                "time": time.time(),
+                "duration_ms": round(duration * 1000, 2),
+            })
+
+    def call_counts(self):
+        """
+        按接口统计调用次数
+        """
+        with self.lock:
+            counts = {}
+            for c in self.calls:
+                counts[c["endpoint"]] = counts.get(c["endpoint"], 0) + 1
+            return counts
+
+    def reset_calls(self):
+        with self.lock:
+            self.calls.clear()
+
+    def should_throttle(self):
+        with self.lock:
+            n = len(self.calls) + 1
+            if self.throttle_every and n % self.throttle_every == 0:
+                return True
+            if self.throttle_rate and self._rng.random() < self.throttle_rate:
+                return True
+            if self.rate_limit:
+                now = time.monotonic()
+                self._window = [t for t in self._window if now - t < 1.0]
+                if len(self._window) >= self.rate_limit:
+                    return True
+                self._window.append(now)
+            return False
+
+    def delay(self):
+        ms = self.latency_ms + (self._rng.uniform(0, self.jitter_ms) if self.jitter_ms else 0)
+        if ms > 0:
+            time.sleep(ms / 1000.0)
+
+
+_ID = r"([0-9a-fA-F-]{32,36})"
+_ROUTES = [
+    ("GET", re.compile(rf"^/v1/pages/{_ID}$"), "retrieve_page"),
+    ("POST", re.compile(r"^/v1/pages$"), "create_page"),
+    ("PATCH", re.compile(rf"^/v1/pages/{_ID}$"), "update_page"),
+    ("GET", re.compile(rf"^/v1/blocks/{_ID}/children$"), "list_children"),
+    ("PATCH", re.compile(rf"^/v1/blocks/{_ID}/children$"), "append_children"),
+    ("GET", re.compile(rf"^/v1/blocks/{_ID}$"), "retrieve_block"),
+    ("PATCH", re.compile(rf"^/v1/blocks/{_ID}$"), "update_block"),
+    ("DELETE", re.compile(rf"^/v1/blocks/{_ID}$"), "delete_block"),
+    ("GET", re.compile(rf"^/v1/databases/{_ID}$"), "retrieve_database"),
+    ("POST", re.compile(rf"^/v1/databases/{_ID}/query$"), "query_database"),
+    ("POST", re.compile(r"^/v1/search$"), "search"),
+]
+
+
+def _endpoint(method, path):
+    segs = ["{id}" if re.fullmatch(_ID, s) else s for s in path.strip("/").split("/")]
+    if segs and segs[0] == "v1":
+        segs = segs[1:]
+    return f"{method} {'/'.join(segs)}"
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    state = None
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, status, payload, headers=None):
+        data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _dispatch(self, method):
+        started = time.monotonic()
+        url = urlparse(self.path)
+        path = url.path
+        query = parse_qs(url.query)
+        length = int(self.headers.get("Content-Length") or 0)
+        body = json.loads(self.rfile.read(length) or b"{}") if length else {}
+        st = self.state
+
+        if path == "/__calls":
+            self._send(200, {"calls": st.calls, "counts": st.call_counts()})
+            return
+        if path == "/__reset":
+            st.reset_calls()
+            self._send(200, {"ok": True})
+            return
+
+        st.delay()
+        status, payload, headers = self._handle(st, method, path, query, body)
+        # 先记录再响应，保证客户端拿到响应时调用记录已可见
+        st.record(method, path, status, time.monotonic() - started)
+        self._send(status, payload, headers)
+
+    def _handle(self, st, method, path, query, body):
+        if st.should_throttle():
+            return 429, {"object": "error", "status": 429, "code": "rate_limited",
+                         "message": "You have been rate limited. Please try again in a few minutes."}, \
+                {"Retry-After": str(st.retry_after)}
+        try:
+            for m, pattern, name in _ROUTES:
+                match = pattern.match(path)
+                if m != method or not match:
+                    continue
+                args = match.groups()
+                if name == "list_children":
+                    result = st.list_children(args[0], (query.get("start_cursor") or [None])[0], (query.get("page_size") or [100])[0])
+                elif name == "query_database":
+                    result = st.query_database(args[0], body, query.get("filter_properties"))
+                elif name in ("create_page", "search"):
+                    result = getattr(st, name)(body)
+                elif name in ("update_page", "append_children", "update_block"):
+                    result = getattr(st, name)(args[0], body)
+                else:
+                    result = getattr(st, name)(args[0])
+                return 200, result, None
+            return 400, {"object": "error", "status": 400, "code": "invalid_request_url", "message": f"Invalid request URL: {method} {path}"}, None
+        except FakeNotionError as e:
+            return e.status, {"object": "error", "status": e.status, "code": e.code, "message": e.message}, None
+        except Exception as e:
+            return 500, {"object": "error", "status": 500, "code": "internal_server_error", "message": str(e)}, None
+
+    def do_GET(self):
+        self._dispatch("GET")
+
+    def do_POST(self):
+        self._dispatch("POST")
+
+    def do_PATCH(self):
+        self._dispatch("PATCH")
+
+    def do_DELETE(self):
+        self._dispatch("DELETE")
+
+
+class FakeNotionServer:
+    """
+    在后台线程中运行的模拟服务
+
+    示例:
+        server = FakeNotionServer(latency_ms=50).start()
+        os.environ["NOTION_BASE_URL"] = server.url
+        ...
+        server.stop()
+    """
+
+    def __init__(self, host="127.0.0.1", port=0, **options):
+        self.state = FakeNotionState(**options)
+        handler = type("Handler", (_Handler,), {"state": self.state})
+        self.httpd = ThreadingHTTPServer((host, port), handler)
+        self.httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="本地模拟 Notion API（用于离线测试与压测）")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency-ms", type=float, default=0, help="每次调用的固定延迟（毫秒）")
+    parser.add_argument("--jitter-ms", type=float, default=0, help="额外的随机延迟上限（毫秒）")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="随机返回 429 的概率")
+    parser.add_argument("--throttle-every", type=int, default=0, help="每 N 次调用返回一次 429")
+    parser.add_argument("--rate-limit", type=float, default=0.0, help="每秒最多请求数，超出返回 429（0 为不限）")
+    parser.add_argument("--retry-after", type=float, default=1, help="429 响应的 Retry-After 秒数")
+    args = parser.parse_args()
+
+    server = FakeNotionServer(
+        host=args.host,
+        port=args.port,
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        throttle_rate=args.throttle_rate,
+        throttle_every=args.throttle_every,
+        retry_after=args.retry_after,
+        rate_limit=args.rate_limit,
+    )
+    # 预置父页面与想法数据库，便于直接运行各脚本
+    root = server.state.seed_page("每日总结")
+    db = server.state.seed_database(root["id"], "想法看板", {
+        "名称": {"type": "title", "title": {}},
+        "描述": {"type": "rich_text", "rich_text": {}},
+        "状态": {"type": "status", "status": {"options": [{"name": "未开始"}, {"name": "进行中"}, {"name": "完成"}]}},
+    })
+    print(f"模拟 Notion API 已启动: {server.url}")
+    print(f"   NOTION_BASE_URL={server.url}")
+    print(f"   DIARY_PARENT_PAGE_ID={root['id']}")
+    print(f"   IDEA_DB_ID={db['id']}")
+    print("   调用记录: GET /__calls，清空: POST /__reset")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.httpd.server_close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
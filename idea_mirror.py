@@ -0,0 +1,181 @@
+import json
+import sqlite3
+import threading
+import local_store
+
+# 想法数据库的本地镜像文件（位于本地缓存目录中）
+IDEA_MIRROR_FILE = "idea_mirror.sqlite3"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS pages (
+    id TEXT PRIMARY KEY,
+    database_id TEXT NOT NULL,
+    created_time TEXT,
+    last_edited_time TEXT,
+    status TEXT,
+    synced_at TEXT,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_pages_status ON pages (database_id, status);
+CREATE TABLE IF NOT EXISTS sync_state (
+    database_id TEXT PRIMARY KEY,
+    watermark TEXT,
+    full_sync_at REAL
+);
+"""
+
+"""
+想法数据库的 SQLite 镜像：只存储页面对象与同步水位，不发起任何 Notion 请求
+"""
+class IdeaMirror:
+    """
+    按数据库ID分区保存页面对象，读取时按状态筛选
+    """
+
+    def __init__(self, path=None):
+        self.path = path or local_store.path_for(IDEA_MIRROR_FILE)
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.executescript(_SCHEMA)
+        self._conn.commit()
+
+    def get_state(self, database_id):
+        """
+        返回 (水位, 上次全量同步时间戳)，从未同步时为 (None, None)
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT watermark, full_sync_at FROM sync_state WHERE database_id = ?",
+                (database_id,),
+            ).fetchone()
+            return (row[0], row[1]) if row else (None, None)
+
+    def upsert(self, database_id, pages, status_name, sync_stamp, watermark=None):
+        """
+        写入一批页面并推进水位（同一事务内完成，中途失败不会留下半批数据）
+
+        Args:
+            database_id: 数据库ID
+            pages: Notion 页面对象列表
+            status_name: 状态属性名，用于提取状态列
+            sync_stamp: 本次同步的标记，全量同步结束后据此清除未再出现的页面
+            watermark: 可选，新的水位（本批最大的 last_edited_time）
+        """
+        rows = []
+        for page in pages:
+            rows.append((
+                page.get("id"),
+                database_id,
+                page.get("created_time"),
+                page.get("last_edited_time"),
+                _status_value(page, status_name),
+                sync_stamp,
+                json.dumps(page, ensure_ascii=False),
+            ))
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO pages (id, database_id, created_time, last_edited_time, status, synced_at, data) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+            for page in pages:
+                if page.get("archived") or page.get("in_trash"):
+                    self._conn.execute("DELETE FROM pages WHERE id = ?", (page.get("id"),))
+            if watermark:
+                self._conn.execute(
+                    "INSERT INTO sync_state (database_id, watermark) VALUES (?, ?) "
+                    "ON CONFLICT(database_id) DO UPDATE SET watermark = excluded.watermark",
+                    (database_id, watermark),
+                )
+
+    def finish_full_sync(self, database_id, sync_stamp, finished_at):
+        """
+        全量同步完成：删除本次未出现的页面（已删除或移出数据库），并记录完成时间
+
+        Returns:
+            int: 删除的页面数
+        """
+        with self._lock, self._conn:
+            cur = self._conn.execute(
+                "DELETE FROM pages WHERE database_id = ? AND (synced_at IS NULL OR synced_at != ?)",
+                (database_id, sync_stamp),
+            )
+            self._conn.execute(
+                "INSERT INTO sync_state (database_id, full_sync_at) VALUES (?, ?) "
+                "ON CONFLICT(database_id) DO UPDATE SET full_sync_at = excluded.full_sync_at",
+                (database_id, finished_at),
+            )
+            return cur.rowcount
+
+    def set_status(self, page_id, status):
+        """
+        本地更新页面状态（例如标记为完成后），无需等待下一次同步
+        """
+        with self._lock, self._conn:
+            self._conn.execute("UPDATE pages SET status = ? WHERE id = ?", (status, page_id))
+
+    def delete(self, page_id):
+        """
+        移除单个页面（已归档或删除的页面不会出现在增量查询中，需要单独移除）
+        """
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM pages WHERE id = ?", (page_id,))
+
+    def iter_pages(self, database_id, status=None):
+        """
+        按创建时间顺序读取镜像中的页面对象
+
+        Args:
+            database_id: 数据库ID
+            status: 可选，只返回该状态的页面
+        """
+        sql = "SELECT data FROM pages WHERE database_id = ?"
+        params = [database_id]
+        if status is not None:
+            sql += " AND status = ?"
+            params.append(status)
+        sql += " ORDER BY created_time, id"
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        for (data,) in rows:
+            yield json.loads(data)
+
+    def count(self, database_id):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM pages WHERE database_id = ?", (database_id,)).fetchone()[0]
+
+    def clear(self, database_id):
+        """
+        清空某个数据库的镜像与水位（结构变化后重新全量同步）
+        """
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM pages WHERE database_id = ?", (database_id,))
+            self._conn.execute("DELETE FROM sync_state WHERE database_id = ?", (database_id,))
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def _status_value(page, status_name):
+    """
+    提取页面状态属性的选项名
+    """
+    prop = (page.get("properties") or {}).get(status_name) or {}
+    value = prop.get(prop.get("type")) or {}
+    return value.get("name") if isinstance(value, dict) else None
+
+
+_mirror = None
+_mirror_lock = threading.Lock()
+
+
+def get_mirror():
+    """
+    获取共享的镜像实例（懒加载）
+    """
+    global _mirror
+    with _mirror_lock:
+        if _mirror is None:
+            _mirror = IdeaMirror()
+        return _mirror
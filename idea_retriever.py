@@ -1,44 +1,159 @@
 import os
-import json
+import time
+import threading
+import concurrent.futures
 from datetime import datetime, timedelta
-from notion_client import Client
 from notion_client.errors import APIResponseError
-import requests
+import notion_api
+import local_store
+import idea_mirror
 
 # 从环境变量获取配置
 NOTION_TOKEN = os.environ.get("NOTION_TOKEN")
 IDEA_DB_ID = os.environ.get("IDEA_DB_ID")
+# 并发获取想法正文的线程数（所有请求仍受共享限速器约束）
+IDEA_FETCH_WORKERS = int(os.environ.get("IDEA_FETCH_WORKERS") or 4)
+# 跨运行的想法正文缓存：页面ID + last_edited_time -> 文本
+IDEA_CONTENT_CACHE_FILE = "idea_content_cache.json"
+IDEA_CONTENT_CACHE_TTL = float(os.environ.get("IDEA_CONTENT_CACHE_TTL_DAYS") or 14) * 24 * 3600
+# 跨运行的结构缓存：来源ID -> 数据库ID，数据库ID -> 属性结构与状态属性
+IDEA_SCHEMA_CACHE_FILE = "idea_schema_cache.json"
+# 查询返回这些错误时说明缓存的数据库ID或属性结构已失效
+SCHEMA_ERROR_CODES = ("validation_error", "object_not_found")
+# 想法同步模式：query 每次直接查询；mirror 维护本地 SQLite 镜像，只拉取上次同步后编辑过的页面
+IDEA_SYNC_MODE = (os.environ.get("IDEA_SYNC_MODE") or "query").lower()
+# 镜像模式下定期全量同步一次，用于清除已删除或移出数据库的页面
+IDEA_MIRROR_FULL_SYNC_DAYS = float(os.environ.get("IDEA_MIRROR_FULL_SYNC_DAYS") or 7)
 
-# 初始化Notion客户端
-notion = Client(auth=NOTION_TOKEN)
+# 使用共享的限速Notion客户端
+notion = notion_api.get_client(NOTION_TOKEN)
 
 """
 获取想法的脚本
 """
-def get_database_id_from_page(page_id):
+_schema_cache = None
+_schema_lock = threading.RLock()
+
+
+def _get_schema_cache():
+    """
+    懒加载结构缓存：{"sources": {来源ID: {...}}, "databases": {数据库ID: {...}}}
+    """
+    global _schema_cache
+    with _schema_lock:
+        if _schema_cache is None:
+            data = local_store.load_json(IDEA_SCHEMA_CACHE_FILE, {}) or {}
+            _schema_cache = {
+                "sources": data.get("sources") or {},
+                "databases": data.get("databases") or {},
+            }
+        return _schema_cache
+
+
+def _save_schema_cache():
+    with _schema_lock:
+        local_store.save_json(IDEA_SCHEMA_CACHE_FILE, _get_schema_cache())
+
+
+def _is_schema_error(e):
+    """
+    判断异常是否由数据库ID失效或属性结构变化引起
+    """
+    if getattr(e, "code", None) in SCHEMA_ERROR_CODES:
+        return True
+    return any(code in str(e) for code in SCHEMA_ERROR_CODES)
+
+
+def _status_info(properties):
+    """
+    从属性结构中解析状态属性的名称、类型与选项名
+    """
+    status_name = None
+    for name, prop in properties.items():
+        if prop.get("type") in ("status", "select"):
+            status_name = name
+            break
+    if not status_name:
+        for name in ("状态", "Status"):
+            if name in properties:
+                status_name = name
+                break
+    if not status_name:
+        return None
+    prop = properties[status_name]
+    status_type = prop.get("type")
+    options = (prop.get(status_type) or {}).get("options", [])
+    return {
+        "name": status_name,
+        "type": status_type,
+        "options": [o.get("name", "") for o in options],
+    }
+
+
+def _remember_database(database_id, properties):
+    with _schema_lock:
+        _get_schema_cache()["databases"][database_id] = {
+            "properties": properties,
+            "status": _status_info(properties),
+            "at": time.time(),
+        }
+        _save_schema_cache()
+
+
+def _remember_source(source_id, kind, database_id):
+    with _schema_lock:
+        _get_schema_cache()["sources"][source_id] = {
+            "kind": kind,
+            "database_id": database_id,
+            "at": time.time(),
+        }
+        _save_schema_cache()
+
+
+def invalidate_schema_cache(database_id=None, source_id=None):
+    """
+    清除失效的结构缓存
+    
+    Args:
+        database_id: 要清除的数据库ID（同时清除解析到该数据库的来源）
+        source_id: 要清除的来源ID
+    """
+    with _schema_lock:
+        cache = _get_schema_cache()
+        if database_id:
+            cache["databases"].pop(database_id, None)
+            for sid in [k for k, v in cache["sources"].items() if v.get("database_id") == database_id]:
+                cache["sources"].pop(sid, None)
+        if source_id:
+            cache["sources"].pop(source_id, None)
+        _save_schema_cache()
+
+
+def get_database_id_from_page(page_id, blocks=None):
     """
     如果提供的是页面ID，检查页面中是否包含子数据库，如果有则返回子数据库ID
+    
+    Args:
+        page_id: 页面ID
+        blocks: 可选，调用方已获取的页面子块列表响应，避免重复请求
     """
     try:
-        # 先尝试作为页面获取
-        page = notion.pages.retrieve(page_id=page_id)
-        if page.get("object") != "page":
-            return None
-        
-        blocks = notion.blocks.children.list(block_id=page_id)
+        if blocks is None:
+            # 先尝试作为页面获取
+            page = notion.pages.retrieve(page_id=page_id)
+            if page.get("object") != "page":
+                return None
+            
+            blocks = notion.blocks.children.list(block_id=page_id)
         db_ids = [b.get("id") for b in blocks.get("results", []) if b.get("type") == "child_database"]
         if not db_ids:
             return None
         for dbid in db_ids:
-            try:
-                db = notion.databases.retrieve(database_id=dbid)
-                props = db.get("properties", {})
-                for name, prop in props.items():
-                    t = prop.get("type")
-                    if t == "status" or (t == "select" and name in ("状态", "Status")):
-                        return dbid
-            except Exception:
-                continue
+            props = get_database_properties(dbid)
+            for name, prop in props.items():
+                t = prop.get("type")
+                if t == "status" or (t == "select" and name in ("状态", "Status")):
+                    return dbid
         return db_ids[0]
     except Exception as e:
         return None
@@ -46,185 +161,495 @@ def get_database_id_from_page(page_id):
 
 def get_database_properties(database_id):
     """
-    获取数据库的属性结构
+    获取数据库的属性结构（优先使用结构缓存）
     """
+    entry = _get_schema_cache()["databases"].get(database_id)
+    if entry and entry.get("properties"):
+        return entry["properties"]
     try:
         database = notion.databases.retrieve(database_id=database_id)
-        return database.get("properties", {})
+        properties = database.get("properties", {})
+        if properties:
+            _remember_database(database_id, properties)
+        return properties
     except Exception as e:
         print(f"获取数据库属性失败: {e}")
         return {}
 
 
+def get_status_property(database_id):
+    """
+    获取数据库状态属性的名称、类型与选项名
+    
+    Returns:
+        dict: {"name": str, "type": str, "options": list}，未找到时为 None
+    """
+    properties = get_database_properties(database_id)
+    entry = _get_schema_cache()["databases"].get(database_id)
+    if entry and "status" in entry:
+        return entry["status"]
+    return _status_info(properties) if properties else None
+
+
+def resolve_database_id(source_id=None):
+    """
+    将来源ID解析为想法数据库ID：来源本身是数据库时直接返回，是页面时取其子数据库
+    
+    解析结果写入结构缓存，之后的运行不再重复发现。
+    """
+    sid = source_id or IDEA_DB_ID
+    entry = _get_schema_cache()["sources"].get(sid)
+    if entry and entry.get("database_id"):
+        return entry["database_id"]
+    error = None
+    try:
+        database = notion.databases.retrieve(database_id=sid)
+    except Exception as e:
+        database = None
+        error = e
+    if database and database.get("object") == "database":
+        _remember_database(sid, database.get("properties", {}))
+        _remember_source(sid, "database", sid)
+        return sid
+    db_id = get_database_id_from_page(sid)
+    if not db_id:
+        if error:
+            raise error
+        raise ValueError(f"提供的ID {sid} 既不是有效的数据库ID，也不是包含子数据库的页面ID")
+    _remember_source(sid, "page", db_id)
+    return db_id
+
+
+def _query_database(database_id, body, filter_properties=None):
+    """
+    执行一次 databases/{id}/query（兼容缺少 query 方法的旧版 SDK）
+    
+    Args:
+        database_id: 数据库ID
+        body: 请求体（filter、page_size、start_cursor 等）
+        filter_properties: 可选，只返回这些属性ID
+    """
+    if hasattr(notion.databases, "query"):
+        params = dict(body)
+        if filter_properties:
+            params["filter_properties"] = filter_properties
+        return notion.databases.query(database_id=database_id, **params)
+    query = {"filter_properties": filter_properties} if filter_properties else None
+    return notion_api.request_json("POST", f"databases/{database_id}/query", body=body, query=query)
+
+
+def _needed_property_ids(properties, status_name):
+    """
+    返回标题、描述与状态属性的ID，用于 filter_properties 只传输需要的字段
+    """
+    title_name, description_name = resolve_idea_properties(properties)
+    title_id = properties.get(title_name, {}).get("id") if title_name else None
+    desc_id = properties.get(description_name, {}).get("id") if description_name else None
+    status_id = properties.get(status_name, {}).get("id")
+    ids = [i for i in (title_id, desc_id, status_id) if i]
+    # 缺少任一ID（例如属性结构取自样本页面）时不做裁剪
+    return ids if title_id and status_id else None
+
+
+def _iter_idea_query(specific_db_id, page_size, ctx):
+    """
+    iter_idea_database 的查询主体；实际查询的数据库ID记录在 ctx 中，便于失败时清除对应缓存
+    """
+    # 如果未指定特定ID，则执行自动发现逻辑（解析结果来自结构缓存时不发请求）
+    actual_db_id = specific_db_id or resolve_database_id(IDEA_DB_ID)
+    ctx["database_id"] = actual_db_id
+    
+    # 计算30天前的日期
+    thirty_days_ago = (datetime.now() - timedelta(days=30)).strftime("%Y-%m-%d")
+    
+    properties = get_database_properties(actual_db_id)
+    if not properties:
+        try:
+            sample = _query_database(actual_db_id, {"page_size": 1})
+            items = sample.get("results", [])
+            if items:
+                props_from_page = items[0].get("properties", {})
+                properties = {k: {"type": v.get("type")} for k, v in props_from_page.items()}
+        except Exception as e:
+            # 数据库ID失效时交给 iter_idea_database 清除缓存并重新发现
+            if _is_schema_error(e):
+                raise
+            properties = {}
+
+    def _find_property_by_type(props, types):
+        for name, prop in props.items():
+            if prop.get("type") in types:
+                return name, prop.get("type")
+        return None, None
+
+    def _resolve_status_value(prop_def):
+        t = prop_def.get("type")
+        cfg = prop_def.get(t, {})
+        options = cfg.get("options", [])
+        names = [o.get("name", "") for o in options]
+        for candidate in ["未开始", "Not started", "Not Started", "To do", "Todo", "未完成"]:
+            if candidate in names:
+                return candidate
+        return None
+
+    query_params = {"filter": {"and": []}}
+
+    status_name, status_type = _find_property_by_type(properties, ["status", "select"])
+    if not status_name:
+        if "状态" in properties:
+            status_name = "状态"
+            status_type = properties[status_name].get("type")
+        elif "Status" in properties:
+            status_name = "Status"
+            status_type = properties[status_name].get("type")
+    if not status_name or not status_type:
+        print("⚠️  未找到状态属性，无法筛选未开始")
+        return
+    if status_type != "status" and status_type != "select":
+        print("⚠️  状态属性类型非可筛选类型，无法筛选未开始")
+        return
+    value = "未开始"
+    query_params["filter"]["and"].append({
+        "property": status_name,
+        status_type: {
+            "equals": value
+        }
+    })
+    
+    filter_properties = _needed_property_ids(properties, status_name)
+    if IDEA_SYNC_MODE == "mirror":
+        # 先增量同步本地镜像，再从镜像读取“未开始”的想法
+        sync_idea_mirror(actual_db_id, status_name, filter_properties, page_size)
+        yield from idea_mirror.get_mirror().iter_pages(actual_db_id, value)
+        return
+    
+    # 分页执行查询
+    query_params["page_size"] = min(int(page_size or 100), 100)
+    while True:
+        results = _query_database(actual_db_id, query_params, filter_properties)
+        for item in results.get("results", []):
+            yield item
+        next_cursor = results.get("next_cursor")
+        if not results.get("has_more") or not next_cursor:
+            break
+        query_params["start_cursor"] = next_cursor
+
+
+def iter_idea_database(specific_db_id=None, page_size=100):
+    """
+    分页查询想法数据库中状态为“未开始”的记录，逐条产出
+    
+    跟随 next_cursor 取完所有结果，并通过 filter_properties 只拉取标题、描述与状态属性，
+    调用方可以在查询尚未结束时就开始处理已返回的想法。
+    
+    Args:
+        specific_db_id: 可选，指定要查询的数据库ID。如果不提供，则使用IDEA_DB_ID
+        page_size: 每次查询返回的条数（最大100）
+    
+    Yields:
+        dict: 想法页面对象
+    """
+    yielded = False
+    for attempt in range(2):
+        ctx = {}
+        try:
+            for item in _iter_idea_query(specific_db_id, page_size, ctx):
+                yielded = True
+                yield item
+            return
+        except Exception as e:
+            # 缓存的数据库ID或属性结构失效：清除结构缓存后重新发现并重试一次
+            if attempt == 0 and not yielded and _is_schema_error(e):
+                print(f"⚠️  数据库结构可能已变化，清除结构缓存后重试: {e}")
+                invalidate_schema_cache(ctx.get("database_id"), None if specific_db_id else IDEA_DB_ID)
+                if IDEA_SYNC_MODE == "mirror" and ctx.get("database_id"):
+                    idea_mirror.get_mirror().clear(ctx["database_id"])
+                continue
+            raise Exception(f"查询Notion失败: {str(e)}")
+
+
+def sync_idea_mirror(database_id, status_name, filter_properties=None, page_size=100):
+    """
+    增量同步想法数据库到本地 SQLite 镜像
+    
+    只查询 last_edited_time 不早于水位的页面（按编辑时间升序，每页提交一次并推进水位，
+    中断后下次从断点继续）；距上次全量同步超过 IDEA_MIRROR_FULL_SYNC_DAYS 时全量同步，
+    并删除已不在数据库中的页面。
+    
+    Args:
+        database_id: 数据库ID
+        status_name: 状态属性名
+        filter_properties: 可选，只同步这些属性ID
+        page_size: 每次查询返回的条数（最大100）
+    
+    Returns:
+        int: 本次从 Notion 拉取的页面数
+    """
+    mirror = idea_mirror.get_mirror()
+    watermark, full_sync_at = mirror.get_state(database_id)
+    now = time.time()
+    full = not watermark or not full_sync_at or now - full_sync_at > IDEA_MIRROR_FULL_SYNC_DAYS * 24 * 3600
+    stamp = f"{now:.6f}"
+    
+    body = {
+        "page_size": min(int(page_size or 100), 100),
+        "sorts": [{"timestamp": "last_edited_time", "direction": "ascending"}],
+    }
+    if not full:
+        # Notion 的 last_edited_time 精确到分钟，使用 on_or_after 并依赖主键去重
+        body["filter"] = {"timestamp": "last_edited_time", "last_edited_time": {"on_or_after": watermark}}
+    fetched = 0
+    while True:
+        results = _query_database(database_id, body, filter_properties)
+        pages = results.get("results", [])
+        fetched += len(pages)
+        edited = [p.get("last_edited_time") for p in pages if p.get("last_edited_time")]
+        mirror.upsert(database_id, pages, status_name, stamp, max(edited + [watermark or ""]) or None)
+        next_cursor = results.get("next_cursor")
+        if not results.get("has_more") or not next_cursor:
+            break
+        body["start_cursor"] = next_cursor
+    if full:
+        removed = mirror.finish_full_sync(database_id, stamp, now)
+        print(f"✅ 想法镜像全量同步完成：{fetched} 条，清除 {removed} 条")
+    else:
+        print(f"✅ 想法镜像增量同步完成：{fetched} 条变更，镜像共 {mirror.count(database_id)} 条")
+    return fetched
+
+
 def query_idea_database(specific_db_id=None):
     """
-    查询想法数据库，获取最近30天的记录
+    查询想法数据库，获取全部“未开始”的记录
     
     Args:
         specific_db_id: 可选，指定要查询的数据库ID。如果不提供，则使用IDEA_DB_ID
     """
-    try:
-        # 检查是否需要从页面中提取数据库ID
-        actual_db_id = specific_db_id or IDEA_DB_ID
-        
-        # 如果未指定特定ID，则执行自动发现逻辑
-        if not specific_db_id:
-            # 先尝试直接作为数据库查询；失败时回退为页面并提取子数据库
-            try:
-                database = notion.databases.retrieve(database_id=actual_db_id)
-                if database.get("object") != "database":
-                    actual_db_id = get_database_id_from_page(IDEA_DB_ID)
-                    if not actual_db_id:
-                        raise ValueError(f"提供的ID {IDEA_DB_ID} 既不是有效的数据库ID，也不是包含子数据库的页面ID")
-            except Exception:
-                actual_db_id = get_database_id_from_page(IDEA_DB_ID)
-                if not actual_db_id:
-                    raise
-        
-        # 计算30天前的日期
-        thirty_days_ago = (datetime.now() - timedelta(days=30)).strftime("%Y-%m-%d")
-        
-        properties = get_database_properties(actual_db_id)
-        if not properties:
-            try:
-                sample_body = {"page_size": 1}
-                if hasattr(notion.databases, "query"):
-                    sample = notion.databases.query(database_id=actual_db_id, **sample_body)
-                else:
-                    url = f"https://api.notion.com/v1/databases/{actual_db_id}/query"
-                    headers = {
-                        "Authorization": f"Bearer {NOTION_TOKEN}",
-                        "Notion-Version": "2022-06-28",
-                        "Content-Type": "application/json"
-                    }
-                    resp = requests.post(url, headers=headers, data=json.dumps(sample_body))
-                    if resp.status_code != 200:
-                        sample = {"results": []}
-                    else:
-                        sample = resp.json()
-                items = sample.get("results", [])
-                if items:
-                    props_from_page = items[0].get("properties", {})
-                    properties = {k: {"type": v.get("type")} for k, v in props_from_page.items()}
-            except Exception:
-                properties = {}
+    return list(iter_idea_database(specific_db_id))
 
-        def _find_property_by_type(props, types):
-            for name, prop in props.items():
-                if prop.get("type") in types:
-                    return name, prop.get("type")
-            return None, None
-
-        def _resolve_status_value(prop_def):
-            t = prop_def.get("type")
-            cfg = prop_def.get(t, {})
-            options = cfg.get("options", [])
-            names = [o.get("name", "") for o in options]
-            for candidate in ["未开始", "Not started", "Not Started", "To do", "Todo", "未完成"]:
-                if candidate in names:
-                    return candidate
-            return None
 
-        query_params = {"filter": {"and": []}}
-
-        status_name, status_type = _find_property_by_type(properties, ["status", "select"])
-        if not status_name:
-            if "状态" in properties:
-                status_name = "状态"
-                status_type = properties[status_name].get("type")
-            elif "Status" in properties:
-                status_name = "Status"
-                status_type = properties[status_name].get("type")
-        if not status_name or not status_type:
-            print("⚠️  未找到状态属性，无法筛选未开始")
-            return []
-        if status_type != "status" and status_type != "select":
-            print("⚠️  状态属性类型非可筛选类型，无法筛选未开始")
-            return []
-        value = "未开始"
-        query_params["filter"]["and"].append({
-            "property": status_name,
-            status_type: {
-                "equals": value
-            }
-        })
-        
-        # 执行查询（兼容缺少 query 方法的旧版 SDK）
-        if hasattr(notion.databases, "query"):
-            results = notion.databases.query(
-                database_id=actual_db_id,
-                **query_params
-            )
-        else:
-            url = f"https://api.notion.com/v1/databases/{actual_db_id}/query"
-            headers = {
-                "Authorization": f"Bearer {NOTION_TOKEN}",
-                "Notion-Version": "2022-06-28",
-                "Content-Type": "application/json"
-            }
-            resp = requests.post(url, headers=headers, data=json.dumps(query_params))
-            if resp.status_code != 200:
-                raise Exception(f"查询Notion失败: {resp.status_code} {resp.text}")
-            results = resp.json()
-        
-        return results.get("results", [])
-    except Exception as e:
-        raise Exception(f"查询Notion失败: {str(e)}")
+_TITLE_NAMES = ("名称", "Name", "标题", "Title")
+_DESCRIPTION_NAMES = ("描述", "Description", "内容", "Content")
+
+
+def resolve_idea_properties(properties):
+    """
+    根据属性结构确定标题与描述属性名
+    
+    Args:
+        properties: 数据库属性结构或页面的 properties
+    
+    Returns:
+        tuple: (标题属性名, 描述属性名)，未找到时为 None
+    """
+    title_name = next((n for n in _TITLE_NAMES if properties.get(n, {}).get("type") == "title"), None)
+    if not title_name:
+        title_name = next((n for n, p in properties.items() if p.get("type") == "title"), None)
+    description_name = next(
+        (n for n in _DESCRIPTION_NAMES if properties.get(n, {}).get("type") in ("rich_text", "plain_text")),
+        None,
+    )
+    if not description_name:
+        description_name = next((n for n, p in properties.items() if p.get("type") == "rich_text"), None)
+    return title_name, description_name
+
+
+class IdeaExtractor:
+    """
+    按属性结构预先确定标题与描述属性，同一数据库的所有想法复用
+    """
+
+    def __init__(self, title_name, description_name):
+        self.title_name = title_name
+        self.description_name = description_name
+
+    def matches(self, properties):
+        """
+        页面是否包含预先确定的属性（属性被重命名或来自其他结构时需要重新编译）
+        """
+        return (
+            (self.title_name is None or self.title_name in properties)
+            and (self.description_name is None or self.description_name in properties)
+        )
+
+    def title(self, idea):
+        prop = idea.get("properties", {}).get(self.title_name) if self.title_name else None
+        if not prop:
+            return "无标题"
+        return notion_api.rich_text_plain(prop.get("title"))
+
+    def description(self, idea):
+        prop = idea.get("properties", {}).get(self.description_name) if self.description_name else None
+        if not prop:
+            return ""
+        if prop.get("type") == "plain_text":
+            return prop.get("plain_text", "")
+        return notion_api.rich_text_plain(prop.get("rich_text"))
+
+
+_extractors = {}
+_extractors_lock = threading.Lock()
+
+
+def _cached_schema(database_id):
+    """
+    从结构缓存中读取数据库属性结构（不发请求；ID 是否带连字符均可）
+    """
+    databases = _get_schema_cache()["databases"]
+    entry = databases.get(database_id)
+    if not entry:
+        key = database_id.replace("-", "")
+        entry = next((v for k, v in databases.items() if k.replace("-", "") == key), None)
+    return (entry or {}).get("properties")
+
+
+def get_idea_extractor(idea):
+    """
+    获取想法所属数据库的属性提取器（按父数据库缓存，优先由数据库结构编译）
+    """
+    parent = idea.get("parent") or {}
+    key = parent.get("database_id") or parent.get("type") or "page"
+    properties = idea.get("properties", {})
+    extractor = _extractors.get(key)
+    if extractor is not None and extractor.matches(properties):
+        return extractor
+    with _extractors_lock:
+        schema = _cached_schema(parent["database_id"]) if extractor is None and parent.get("database_id") else None
+        extractor = IdeaExtractor(*resolve_idea_properties(schema or properties))
+        if not extractor.matches(properties):
+            extractor = IdeaExtractor(*resolve_idea_properties(properties))
+        _extractors[key] = extractor
+    return extractor
 
 
 def get_idea_title(idea):
     """
     获取想法的标题
     """
-    title_property = idea.get("properties", {})
-    for prop_name in ["名称", "Name", "标题", "Title"]:
-        if prop_name in title_property:
-            title_parts = title_property[prop_name].get("title", [])
-            return "".join(part.get("text", {}).get("content", "") for part in title_parts)
-    for name, prop in title_property.items():
-        if prop.get("type") == "title":
-            title_parts = prop.get("title", [])
-            return "".join(part.get("text", {}).get("content", "") for part in title_parts)
-    return "无标题"
+    return get_idea_extractor(idea).title(idea)
 
 
 def get_idea_description(idea):
     """
     获取想法的描述
     """
-    description_property = idea.get("properties", {})
-    for prop_name in ["描述", "Description", "内容", "Content"]:
-        if prop_name in description_property:
-            if description_property[prop_name].get("type") == "rich_text":
-                description_parts = description_property[prop_name].get("rich_text", [])
-                return "".join(part.get("text", {}).get("content", "") for part in description_parts)
-            elif description_property[prop_name].get("type") == "plain_text":
-                return description_property[prop_name].get("plain_text", "")
-    for prop in description_property.values():
-        if prop.get("type") == "rich_text":
-            description_parts = prop.get("rich_text", [])
-            return "".join(part.get("text", {}).get("content", "") for part in description_parts)
-    return ""
+    return get_idea_extractor(idea).description(idea)
+
+
+# 本次运行内已获取的想法正文：页面ID -> 文本，保证每个想法的块最多只拉取一次
+_content_memo = {}
+# 正文提取方式的版本；提取规则变化后旧缓存自动失效
+_CONTENT_FORMAT = 2
+_content_cache = None
+_content_cache_lock = threading.RLock()
+
+
+def _get_content_cache():
+    """
+    懒加载跨运行的正文缓存，并丢弃超过 TTL 的条目
+    """
+    global _content_cache
+    with _content_cache_lock:
+        if _content_cache is None:
+            data = local_store.load_json(IDEA_CONTENT_CACHE_FILE, {}) or {}
+            now = time.time()
+            _content_cache = {k: v for k, v in data.items() if now - v.get("at", 0) <= IDEA_CONTENT_CACHE_TTL}
+        return _content_cache
+
+
+def save_content_cache(keep_idea_ids=None):
+    """
+    写回正文缓存
+    
+    Args:
+        keep_idea_ids: 可选，本次筛选结果中的想法ID；此前缓存过、但已不在筛选结果中的想法会被移除
+    """
+    with _content_cache_lock:
+        cache = _get_content_cache()
+        if keep_idea_ids is not None:
+            keep = set(keep_idea_ids)
+            for k in [k for k, v in cache.items() if v.get("idea") and k not in keep]:
+                cache.pop(k, None)
+            for k in keep:
+                if k in cache:
+                    cache[k]["idea"] = True
+        local_store.save_json(IDEA_CONTENT_CACHE_FILE, cache)
 
 
 def get_idea_content(idea):
     """
     获取想法页面的内容
+    
+    页面的 last_edited_time 与缓存一致时直接返回缓存文本，不再请求块列表；
+    否则读取完整的块树，包含所有带文本的块类型。
     """
+    idea_id = idea.get("id")
+    if idea_id in _content_memo:
+        return _content_memo[idea_id]
+    edited = idea.get("last_edited_time")
+    if edited:
+        entry = _get_content_cache().get(idea_id)
+        if entry and entry.get("edited") == edited and entry.get("format") == _CONTENT_FORMAT:
+            _content_memo[idea_id] = entry.get("text", "")
+            return _content_memo[idea_id]
     try:
-        blocks = notion.blocks.children.list(block_id=idea.get("id"))
+        # 读取完整块树（分页、折叠块与嵌套列表），嵌套内容按深度缩进
         content = []
-        for block in blocks.get("results", []):
-            block_type = block.get("type")
-            if block_type == "paragraph":
-                text_parts = block.get("paragraph", {}).get("rich_text", [])
-                content.append("".join(part.get("text", {}).get("content", "") for part in text_parts))
-        return "\n".join(content)
+        for depth, block in notion_api.iter_block_tree(idea_id, client=notion):
+            line = notion_api.block_text(block)
+            if line:
+                content.append("  " * depth + line)
+        text = "\n".join(content)
+        _content_memo[idea_id] = text
+        if edited:
+            with _content_cache_lock:
+                _get_content_cache()[idea_id] = {"edited": edited, "text": text, "format": _CONTENT_FORMAT, "at": time.time()}
+        return text
     except Exception as e:
         print(f"获取想法内容失败: {e}")
         return ""
 
 
+def build_idea_text(idea):
+    """
+    组装单个想法的文本：标题、描述与正文
+    """
+    title = get_idea_title(idea)
+    description = get_idea_description(idea)
+    content = get_idea_content(idea)
+    idea_text = f"标题：{title}"
+    if description:
+        idea_text += f"\n描述：{description}"
+    if content:
+        idea_text += f"\n内容：{content}"
+    return idea_text
+
+
+def fetch_idea_texts(ideas, max_workers=None):
+    """
+    以有限并发批量获取想法文本，结果顺序与输入一致
+    
+    ideas 可以是生成器（如 iter_idea_database），查询返回一条就提交一条，
+    正文获取与分页查询同时进行。
+    
+    Args:
+        ideas: 想法页面对象的可迭代序列
+        max_workers: 并发数，默认 IDEA_FETCH_WORKERS
+    
+    Returns:
+        list: 与输入顺序一致的想法文本
+    """
+    workers = max(1, int(max_workers or IDEA_FETCH_WORKERS))
+    ids = []
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = []
+        for idea in ideas:
+            ids.append(idea.get("id"))
+            futures.append(executor.submit(build_idea_text, idea))
+        texts = [f.result() for f in futures]
+    save_content_cache(keep_idea_ids=ids)
+    return texts
+
+
 def scan_idea_source(source_id=None):
     """
     扫描想法来源，查找子数据库和子页面
@@ -245,41 +670,57 @@ def scan_idea_source(source_id=None):
         return result
         
     try:
-        # 1. 检查是否直接是数据库
-        try:
-            obj = notion.databases.retrieve(database_id=sid)
-            if obj.get("object") == "database":
-                result["database_id"] = sid
-                return result
-        except Exception:
-            pass
-            
-        # 2. 作为页面处理，查找子项
-        # 验证是否为页面
-        try:
-            page = notion.pages.retrieve(page_id=sid)
-            if page.get("object") != "page":
-                return result
-        except Exception:
+        entry = _get_schema_cache()["sources"].get(sid)
+        if entry and entry.get("kind") == "database":
+            result["database_id"] = sid
             return result
+        
+        if not entry:
+            # 1. 检查是否直接是数据库
+            try:
+                obj = notion.databases.retrieve(database_id=sid)
+                if obj.get("object") == "database":
+                    _remember_database(sid, obj.get("properties", {}))
+                    _remember_source(sid, "database", sid)
+                    result["database_id"] = sid
+                    return result
+            except Exception:
+                pass
+                
+            # 2. 作为页面处理，查找子项
+            # 验证是否为页面
+            try:
+                page = notion.pages.retrieve(page_id=sid)
+                if page.get("object") != "page":
+                    return result
+            except Exception:
+                return result
             
-        blocks = notion.blocks.children.list(block_id=sid)
+        # 子页面会随时增减，每次运行都重新列出；子块列表只请求一次
+        blocks = {"results": notion_api.list_children(sid, client=notion)}
         
-        # 查找子数据库
-        # 优先使用现有的智能查找逻辑
-        db_id = get_database_id_from_page(sid)
+        # 查找子数据库：缓存的数据库仍在页面中时直接复用，否则重新执行智能查找逻辑
+        db_ids = [b.get("id") for b in blocks.get("results", []) if b.get("type") == "child_database"]
+        db_id = entry.get("database_id") if entry else None
+        if db_id not in db_ids:
+            db_id = get_database_id_from_page(sid, blocks=blocks)
         if db_id:
             result["database_id"] = db_id
+        if not entry or entry.get("database_id") != db_id:
+            _remember_source(sid, "page", db_id)
             
-        # 查找子页面
-        for block in blocks.get("results", []):
-            if block.get("type") == "child_page":
+        # 查找子页面：并发获取完整的页面对象，保持原有顺序，单个失败时跳过
+        child_ids = [b.get("id") for b in blocks.get("results", []) if b.get("type") == "child_page"]
+        if child_ids:
+            def _retrieve(page_id):
                 try:
-                    # 获取完整的页面对象
-                    p = notion.pages.retrieve(page_id=block.get("id"))
-                    result["pages"].append(p)
+                    return notion.pages.retrieve(page_id=page_id)
                 except Exception:
-                    continue
+                    return None
+            
+            workers = max(1, min(IDEA_FETCH_WORKERS, len(child_ids)))
+            with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+                result["pages"] = [p for p in executor.map(_retrieve, child_ids) if p]
                     
         return result
         
@@ -297,21 +738,20 @@ if __name__ == "__main__":
             print(f"- {get_idea_title(idea)}")
     except Exception as e:
         print(f"错误: {e}")
-def update_ideas_status_to_done(ideas, database_id):
-    try:
-        properties = get_database_properties(database_id)
+def _done_status(database_id, ideas):
+    """
+    返回 (状态属性名, 类型, 目标选项名)，属性结构取自结构缓存
+    """
+    status = get_status_property(database_id)
+    if status:
+        status_name = status.get("name")
+        status_type = status.get("type")
+        names = status.get("options") or []
+    else:
         status_name = None
         status_type = None
-        prop_def = None
-        if properties:
-            for name, prop in properties.items():
-                t = prop.get("type")
-                if t in ("status", "select"):
-                    status_name = name
-                    status_type = t
-                    prop_def = prop
-                    break
-        if not status_name and ideas:
+        names = []
+        if ideas:
             p = ideas[0].get("properties", {})
             for name, prop in p.items():
                 t = prop.get("type")
@@ -319,36 +759,91 @@ def update_ideas_status_to_done(ideas, database_id):
                     status_name = name
                     status_type = t
                     break
-        if not status_name or not status_type:
-            return 0
-        options = []
-        if prop_def:
-            cfg = prop_def.get(status_type, {})
-            options = cfg.get("options", [])
-        target = None
-        names = [o.get("name", "") for o in options]
-        for cand in ["完成", "已完成", "Done", "Completed"]:
-            if cand in names:
-                target = cand
-                break
-        if not target and names:
-            target = names[-1]
-        updated = 0
-        for idea in ideas:
-            try:
-                notion.pages.update(
-                    page_id=idea.get("id"),
-                    properties={
-                        status_name: {
-                            status_type: {
-                                "name": target or "完成"
-                            }
-                        }
-                    }
-                )
-                updated += 1
-            except Exception:
-                continue
-        return updated
-    except Exception:
+    target = None
+    for cand in ["完成", "已完成", "Done", "Completed"]:
+        if cand in names:
+            target = cand
+            break
+    if not target and names:
+        target = names[-1]
+    return status_name, status_type, target
+
+
+def set_ideas_done(ideas, database_id):
+    """
+    将想法状态批量更新为完成
+    
+    通过 notion_api.update_pages 并发执行，只重试限流或临时失败的页面；
+    状态属性或选项已变化时清除结构缓存、重新获取后对失败页面再试一次。
+    
+    Args:
+        ideas: 想法页面对象列表
+        database_id: 想法数据库ID
+    
+    Returns:
+        list: 与输入顺序一致的每页结果（见 notion_api.update_pages）
+    """
+    ideas = list(ideas)
+    status_name, status_type, target = _done_status(database_id, ideas)
+    if not status_name or not status_type:
+        return [
+            {"page_id": idea.get("id"), "ok": False, "attempts": 0, "status": None, "code": None, "error": "未找到状态属性"}
+            for idea in ideas
+        ]
+    
+    def _run(indexes):
+        properties = {status_name: {status_type: {"name": target or "完成"}}}
+        return notion_api.update_pages([(ideas[i].get("id"), properties) for i in indexes])
+    
+    indexes = list(range(len(ideas)))
+    results = _run(indexes)
+    failed = [i for i, r in zip(indexes, results) if not r["ok"] and _result_schema_error(r) and not _result_page_gone(r)]
+    if failed:
+        # 状态属性或选项已变化：清除结构缓存、重新获取后重试一次
+        invalidate_schema_cache(database_id)
+        status_name, status_type, target = _done_status(database_id, ideas)
+        if status_name and status_type:
+            for i, r in zip(failed, _run(failed)):
+                r["attempts"] += results[i]["attempts"]
+                results[i] = r
+    if IDEA_SYNC_MODE == "mirror":
+        mirror = idea_mirror.get_mirror()
+        for r in results:
+            if r["ok"]:
+                mirror.set_status(r["page_id"], target or "完成")
+            elif _result_page_gone(r):
+                # 增量查询不会返回已归档或删除的页面，镜像中只能在此处移除
+                mirror.delete(r["page_id"])
+    return results
+
+
+def _result_page_gone(result):
+    """
+    判断 update_pages 的失败结果是否因页面已删除或已归档
+    """
+    error = (result.get("error") or "").lower()
+    return result.get("code") == "object_not_found" or "object_not_found" in error or "archived" in error
+
+
+def _result_schema_error(result):
+    """
+    判断 update_pages 的失败结果是否由状态属性或选项变化引起（页面不存在或已归档不算）
+    """
+    if _result_page_gone(result):
+        return False
+    return result.get("code") == "validation_error" or "validation_error" in (result.get("error") or "")
+
+
+def update_ideas_status_to_done(ideas, database_id):
+    """
+    将想法状态更新为完成，返回成功更新的条数（失败页面逐条打印）
+    """
+    try:
+        results = set_ideas_done(ideas, database_id)
+    except Exception as e:
+        print(f"更新想法状态失败: {e}")
         return 0
+    for r in results:
+        if not r["ok"]:
+            print(f"⚠️  想法状态更新失败 {r['page_id']}（尝试 {r['attempts']} 次）: {r['error']}")
+    return sum(1 for r in results if r["ok"])
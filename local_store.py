@@ -0,0 +1,64 @@
+import os
+import json
+import threading
+
+# 本地缓存目录（GitHub Actions 中通过 actions/cache 在多次运行间保留）
+CACHE_DIR = os.environ.get("NOTION_CACHE_DIR") or os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache")
+
+_lock = threading.RLock()
+
+"""
+本地 JSON 缓存读写（原子写入、线程安全）
+"""
+def path_for(name):
+    """
+    返回缓存文件的完整路径，并确保缓存目录存在
+    """
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    return os.path.join(CACHE_DIR, name)
+
+
+def load_json(name, default=None):
+    """
+    读取缓存文件，不存在或损坏时返回 default
+    """
+    with _lock:
+        try:
+            with open(path_for(name), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except Exception:
+            return default
+
+
+def save_json(name, data):
+    """
+    原子写入缓存文件（先写临时文件再替换）
+    """
+    with _lock:
+        try:
+            path = path_for(name)
+            tmp = f"{path}.{os.getpid()}.tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False)
+            os.replace(tmp, path)
+        except Exception as e:
+            print(f"写入本地缓存失败 {name}: {e}")
+
+
+def update_json(name, fn, default=None):
+    """
+    读取-修改-写回，整个过程持有锁
+
+    Args:
+        name: 缓存文件名
+        fn: 接收当前数据并返回新数据的函数
+        default: 文件不存在时的初始数据
+
+    Returns:
+        新数据
+    """
+    with _lock:
+        data = load_json(name, default)
+        data = fn(data)
+        save_json(name, data)
+        return data
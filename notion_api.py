@@ -0,0 +1,517 @@
+import os
+import re
+import time
+import random
+import threading
+import concurrent.futures
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+from notion_client import Client
+from notion_client.errors import APIResponseError, HTTPResponseError, RequestTimeoutError
+
+# 从环境变量获取配置
+NOTION_TOKEN = os.environ.get("NOTION_TOKEN")
+# 可指向本地模拟服务，便于离线测试
+NOTION_BASE_URL = (os.environ.get("NOTION_BASE_URL") or "https://api.notion.com").rstrip("/")
+# 固定 API 版本，保证 databases/{id}/query 等接口在不同 SDK 版本下行为一致
+NOTION_VERSION = os.environ.get("NOTION_VERSION") or "2022-06-28"
+# Notion 对单个集成的平均限速约为 3 次/秒
+NOTION_RATE_LIMIT = float(os.environ.get("NOTION_RATE_LIMIT") or 3)
+NOTION_BURST = int(os.environ.get("NOTION_BURST") or 3)
+NOTION_MAX_RETRIES = int(os.environ.get("NOTION_MAX_RETRIES") or 5)
+NOTION_POOL_SIZE = int(os.environ.get("NOTION_POOL_SIZE") or 10)
+# 批量更新页面的并发数与失败页面的最大重试轮数（并发请求仍共享同一个令牌桶）
+NOTION_BULK_WORKERS = int(os.environ.get("NOTION_BULK_WORKERS") or 8)
+NOTION_BULK_ROUNDS = int(os.environ.get("NOTION_BULK_ROUNDS") or 3)
+# 递归读取块树的并发数与最大深度（顶层块深度为 0）
+NOTION_TREE_WORKERS = int(os.environ.get("NOTION_TREE_WORKERS") or 4)
+NOTION_TREE_MAX_DEPTH = int(os.environ.get("NOTION_TREE_MAX_DEPTH") or 5)
+
+RETRY_STATUS = (429, 500, 502, 503, 504)
+# 非幂等的写入接口：超时或 5xx 时首次请求可能已经生效，只对 429 与 409（Notion 明确未执行）自动重试，
+# 其他失败交给调用方重新读取状态后决定是否重发
+NON_IDEMPOTENT_ENDPOINTS = ("POST pages", "POST databases", "PATCH blocks/{id}/children", "POST comments")
+NON_IDEMPOTENT_RETRY_STATUS = (409, 429)
+# 这些块的子内容是独立的页面或数据库，读取块树时不展开
+OPAQUE_BLOCK_TYPES = ("child_page", "child_database")
+
+"""
+共享的 Notion 客户端：连接池 + 令牌桶限速 + Retry-After 退避 + 按接口计数
+"""
+class TokenBucket:
+    """
+    线程安全的令牌桶，所有模块与线程共享同一份配额
+    """
+
+    def __init__(self, rate, capacity):
+        self.rate = max(float(rate), 0.001)
+        self.capacity = max(int(capacity), 1)
+        self._tokens = float(self.capacity)
+        self._last = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """
+        取得一个令牌，不足时阻塞等待
+        """
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    wait = self._paused_until - now
+                else:
+                    self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+                    self._last = now
+                    if self._tokens >= 1:
+                        self._tokens -= 1
+                        return
+                    wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+    def pause(self, seconds):
+        """
+        收到 429 后暂停所有请求，并清空已积累的令牌
+        """
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+            self._tokens = 0.0
+
+
+class CallStats:
+    """
+    按接口统计调用次数、限流次数与重试次数
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.calls = {}
+        self.throttled = {}
+        self.retries = {}
+
+    def _inc(self, table, key):
+        with self._lock:
+            table[key] = table.get(key, 0) + 1
+
+    def record_call(self, key):
+        self._inc(self.calls, key)
+
+    def record_throttled(self, key):
+        self._inc(self.throttled, key)
+
+    def record_retry(self, key):
+        self._inc(self.retries, key)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "calls": dict(self.calls),
+                "throttled": dict(self.throttled),
+                "retries": dict(self.retries),
+            }
+
+    def reset(self):
+        with self._lock:
+            self.calls.clear()
+            self.throttled.clear()
+            self.retries.clear()
+
+
+limiter = TokenBucket(NOTION_RATE_LIMIT, NOTION_BURST)
+stats = CallStats()
+
+_ID_SEGMENT = re.compile(r"^[0-9a-fA-F]{32}$|^[0-9a-fA-F]{8}(-[0-9a-fA-F]{4}){3}-[0-9a-fA-F]{12}$")
+
+
+def endpoint_key(method, path):
+    """
+    将请求归一化为接口名，例如 "GET blocks/{id}/children"
+    """
+    path = (path or "").split("?", 1)[0].strip("/")
+    if path.startswith("v1/"):
+        path = path[3:]
+    segs = ["{id}" if _ID_SEGMENT.match(s) else s for s in path.split("/")]
+    return f"{method.upper()} {'/'.join(segs)}"
+
+
+def _retry_delay(retry_after, attempt):
+    """
+    优先使用 Retry-After（秒），否则指数退避加随机抖动
+    """
+    if retry_after:
+        try:
+            return max(float(retry_after), 0.0)
+        except (TypeError, ValueError):
+            pass
+    return min(30.0, 0.5 * (2 ** attempt)) + random.uniform(0, 0.5)
+
+
+def _with_retry(key, send):
+    """
+    在限速器下执行请求，对 429/5xx/超时按退避策略重试
+
+    Args:
+        key: 接口名，用于计数
+        send: 无参函数，执行一次请求；可重试的失败需抛出 _Retryable
+    """
+    attempt = 0
+    while True:
+        limiter.acquire()
+        stats.record_call(key)
+        try:
+            return send()
+        except _Retryable as e:
+            if attempt >= NOTION_MAX_RETRIES:
+                raise e.error
+            delay = _retry_delay(e.retry_after, attempt)
+            if e.status == 429:
+                stats.record_throttled(key)
+                limiter.pause(delay)
+            stats.record_retry(key)
+            time.sleep(delay)
+            attempt += 1
+
+
+def _should_retry(key, status=None):
+    """
+    判断一次失败是否可以自动重试；status 为 None 表示超时
+    """
+    if key in NON_IDEMPOTENT_ENDPOINTS:
+        return status in NON_IDEMPOTENT_RETRY_STATUS
+    return status is None or status in RETRY_STATUS
+
+
+def is_unconfirmed_write(e):
+    """
+    非幂等写入失败后是否可能已经生效（超时、网络错误或 5xx），需要重新读取状态确认
+    """
+    status = getattr(e, "status", None)
+    if isinstance(status, int) and status >= 500:
+        return True
+    return isinstance(e, (RequestTimeoutError, httpx.TransportError, requests.ConnectionError, requests.Timeout))
+
+
+class _Retryable(Exception):
+    def __init__(self, error, status=None, retry_after=None):
+        super().__init__(str(error))
+        self.error = error
+        self.status = status
+        self.retry_after = retry_after
+
+
+class RateLimitedClient(Client):
+    """
+    notion_client.Client 的子类，所有端点调用都经过共享限速器与重试逻辑
+    """
+
+    def request(self, path, method, *args, **kwargs):
+        key = endpoint_key(method, path)
+
+        def _send():
+            try:
+                return super(RateLimitedClient, self).request(path, method, *args, **kwargs)
+            except HTTPResponseError as e:
+                if _should_retry(key, e.status):
+                    raise _Retryable(e, e.status, e.headers.get("Retry-After"))
+                raise
+            except RequestTimeoutError as e:
+                if _should_retry(key):
+                    raise _Retryable(e)
+                raise
+        return _with_retry(key, _send)
+
+
+_clients = {}
+_clients_lock = threading.Lock()
+_session = None
+
+
+def get_client(auth=None):
+    """
+    获取共享的 Notion 客户端（同一令牌只创建一次）
+
+    Args:
+        auth: 集成令牌，默认使用 NOTION_TOKEN
+
+    Returns:
+        RateLimitedClient: 带连接池与限速的客户端
+    """
+    token = auth or NOTION_TOKEN
+    with _clients_lock:
+        client = _clients.get(token)
+        if client is None:
+            http = httpx.Client(limits=httpx.Limits(
+                max_connections=NOTION_POOL_SIZE,
+                max_keepalive_connections=NOTION_POOL_SIZE,
+            ))
+            client = RateLimitedClient(
+                client=http,
+                auth=token,
+                base_url=NOTION_BASE_URL,
+                notion_version=NOTION_VERSION,
+            )
+            _clients[token] = client
+        return client
+
+
+def get_session():
+    """
+    获取共享的 requests 会话（保持连接、预置鉴权头），用于 SDK 未覆盖的接口
+    """
+    global _session
+    with _clients_lock:
+        if _session is None:
+            s = requests.Session()
+            adapter = HTTPAdapter(pool_connections=NOTION_POOL_SIZE, pool_maxsize=NOTION_POOL_SIZE)
+            s.mount("https://", adapter)
+            s.mount("http://", adapter)
+            s.headers.update({
+                "Authorization": f"Bearer {NOTION_TOKEN}",
+                "Notion-Version": NOTION_VERSION,
+                "Content-Type": "application/json",
+            })
+            _session = s
+        return _session
+
+
+def request_json(method, path, body=None, query=None, timeout=60):
+    """
+    通过共享会话直接调用 Notion REST 接口（同样受限速与重试保护）
+
+    Args:
+        method: HTTP 方法
+        path: 接口路径，例如 "databases/{id}/query"
+        body: JSON 请求体
+        query: 查询参数
+
+    Returns:
+        dict: 响应 JSON
+    """
+    url = f"{NOTION_BASE_URL}/v1/{path.lstrip('/')}"
+    key = endpoint_key(method, path)
+
+    def _send():
+        try:
+            resp = get_session().request(method, url, json=body, params=query, timeout=timeout)
+        except requests.Timeout as e:
+            if _should_retry(key):
+                raise _Retryable(e)
+            raise
+        if _should_retry(key, resp.status_code):
+            raise _Retryable(
+                Exception(f"Notion接口调用失败: {resp.status_code} {resp.text}"),
+                resp.status_code,
+                resp.headers.get("Retry-After"),
+            )
+        if resp.status_code != 200:
+            error = Exception(f"Notion接口调用失败: {resp.status_code} {resp.text}")
+            error.status = resp.status_code
+            raise error
+        return resp.json()
+    return _with_retry(key, _send)
+
+
+def _is_transient(e):
+    """
+    判断失败是否值得重试：限流、服务端错误、编辑冲突、超时与网络错误
+    """
+    status = getattr(e, "status", None)
+    if status in RETRY_STATUS or status == 409 or getattr(e, "code", None) == "conflict_error":
+        return True
+    return isinstance(e, (RequestTimeoutError, httpx.TransportError, requests.ConnectionError, requests.Timeout))
+
+
+def update_pages(updates, max_workers=None, rounds=None, client=None):
+    """
+    并发批量更新页面属性，只对限流或临时失败的页面重试
+    
+    单次请求内的 429/5xx 已由 _with_retry 按 Retry-After 退避；在此之上，
+    仍然失败的临时错误会在下一轮中只针对这些页面重试，校验类错误不重试。
+    
+    Args:
+        updates: [(页面ID, properties)] 列表
+        max_workers: 并发数，默认 NOTION_BULK_WORKERS
+        rounds: 最大轮数，默认 NOTION_BULK_ROUNDS
+        client: 可选，使用的客户端，默认共享客户端
+    
+    Returns:
+        list: 与输入顺序一致的结果，每项为
+            {"page_id", "ok", "attempts", "status", "code", "error"}
+    """
+    client = client or get_client()
+    updates = list(updates)
+    results = [
+        {"page_id": page_id, "ok": False, "attempts": 0, "status": None, "code": None, "error": None}
+        for page_id, _ in updates
+    ]
+    pending = list(range(len(updates)))
+    workers = max(1, min(int(max_workers or NOTION_BULK_WORKERS), len(pending) or 1))
+    rounds = max(1, int(rounds or NOTION_BULK_ROUNDS))
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+        for attempt in range(rounds):
+            if not pending:
+                break
+            if attempt:
+                time.sleep(_retry_delay(None, attempt - 1))
+            futures = {
+                executor.submit(client.pages.update, page_id=updates[i][0], properties=updates[i][1]): i
+                for i in pending
+            }
+            retry = []
+            for future in concurrent.futures.as_completed(futures):
+                i = futures[future]
+                result = results[i]
+                result["attempts"] += 1
+                try:
+                    future.result()
+                    result.update(ok=True, status=None, code=None, error=None)
+                except Exception as e:
+                    result.update(
+                        status=getattr(e, "status", None),
+                        code=getattr(e, "code", None),
+                        error=str(e),
+                    )
+                    if _is_transient(e):
+                        retry.append(i)
+            pending = sorted(retry)
+    return results
+
+
+def list_children(block_id, client=None):
+    """
+    分页获取块的全部一级子块
+    """
+    client = client or get_client()
+    items = []
+    cursor = None
+    while True:
+        params = {"block_id": block_id, "page_size": 100}
+        if cursor:
+            params["start_cursor"] = cursor
+        resp = client.blocks.children.list(**params)
+        items.extend(resp.get("results", []))
+        cursor = resp.get("next_cursor")
+        if not resp.get("has_more") or not cursor:
+            break
+    return items
+
+
+def fetch_block_tree(block_id, max_depth=None, max_workers=None, client=None):
+    """
+    并发读取完整的块树
+    
+    每个块的子块列表一返回，就立即提交其中 has_children 块的子块请求，
+    耗时取决于树的深度（以及单层的分页数），而不是块的总数。
+    某个嵌套块的子块读取失败（API 错误、非 JSON 的 HTTP 错误响应、超时或网络错误，均已重试）时
+    保留该块、跳过其子块并打印错误，不影响树的其余部分；
+    顶层读取失败时直接抛出异常。
+    
+    Args:
+        block_id: 页面或块ID
+        max_depth: 最大深度，默认 NOTION_TREE_MAX_DEPTH；0 表示只读取一级子块
+        max_workers: 并发数，默认 NOTION_TREE_WORKERS
+        client: 可选，使用的客户端，默认共享客户端
+    
+    Returns:
+        list: 顶层块列表，有子块的块通过 "children" 字段挂载子块列表
+    """
+    client = client or get_client()
+    max_depth = NOTION_TREE_MAX_DEPTH if max_depth is None else max_depth
+    workers = max(1, int(max_workers or NOTION_TREE_WORKERS))
+    top = []
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+        pending = {executor.submit(list_children, block_id, client): (None, 0)}
+        while pending:
+            done, _ = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                parent, depth = pending.pop(future)
+                if parent is None:
+                    children = future.result()
+                else:
+                    try:
+                        children = future.result()
+                    except (APIResponseError, HTTPResponseError, RequestTimeoutError, httpx.TransportError) as e:
+                        print(f"读取子块失败 {parent.get('id')}，已跳过: {e}")
+                        continue
+                if parent is None:
+                    top = children
+                else:
+                    parent["children"] = children
+                if depth >= max_depth:
+                    continue
+                for block in children:
+                    if block.get("has_children") and block.get("type") not in OPAQUE_BLOCK_TYPES:
+                        pending[executor.submit(list_children, block.get("id"), client)] = (block, depth + 1)
+    return top
+
+
+def iter_block_tree(block_id, max_depth=None, max_workers=None, client=None):
+    """
+    按文档顺序（先序遍历）产出块树中的所有块
+    
+    Yields:
+        tuple: (深度, 块)，顶层块深度为 0
+    """
+    stack = [(0, b) for b in reversed(fetch_block_tree(block_id, max_depth, max_workers, client))]
+    while stack:
+        depth, block = stack.pop()
+        yield depth, block
+        for child in reversed(block.get("children") or []):
+            stack.append((depth + 1, child))
+
+
+def rich_text_plain(parts):
+    """
+    拼接 rich_text 的纯文本
+    
+    优先使用 plain_text（包含提及、公式等非 text 类型的元素），其次 text.content；
+    两者都为空、只有链接的元素使用 href。
+    """
+    out = []
+    for part in parts or []:
+        text = part.get("plain_text")
+        if text is None:
+            text = (part.get("text") or {}).get("content")
+        if not text:
+            text = part.get("href") or ((part.get("text") or {}).get("link") or {}).get("url") or ""
+        out.append(text)
+    return "".join(out)
+
+
+def block_text(block):
+    """
+    块中 rich_text 的纯文本（无文本的块返回空字符串）
+    """
+    data = block.get(block.get("type"), {}) or {}
+    return rich_text_plain(data.get("rich_text"))
+
+
+def get_call_counts():
+    """
+    返回各接口的调用计数快照
+    """
+    return stats.snapshot()
+
+
+def reset_call_counts():
+    stats.reset()
+
+
+def format_call_stats():
+    """
+    格式化调用统计，便于在运行结束时打印
+    """
+    snap = stats.snapshot()
+    calls = snap["calls"]
+    if not calls:
+        return "Notion调用统计: 无"
+    lines = [f"Notion调用统计: 共 {sum(calls.values())} 次"]
+    for key in sorted(calls, key=lambda k: -calls[k]):
+        extra = ""
+        if snap["throttled"].get(key):
+            extra += f"，限流 {snap['throttled'][key]}"
+        if snap["retries"].get(key):
+            extra += f"，重试 {snap['retries'][key]}"
+        lines.append(f"   {key}: {calls[key]}{extra}")
+    return "\n".join(lines)
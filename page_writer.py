@@ -1,21 +1,165 @@
 import os
+import json
+import time
+import difflib
+import hashlib
+import concurrent.futures
 from datetime import datetime
-from notion_client import Client
+import notion_api
+import local_store
+import block_compiler
 
 # 从环境变量获取配置
 NOTION_TOKEN = os.environ.get("NOTION_TOKEN")
 DIARY_PARENT_PAGE_ID = os.environ.get("DIARY_PARENT_PAGE_ID")
+# 页面更新模式：diff（按块差异增量更新）、rewrite（全部删除后重写）或 replace（新建页面后归档旧页面）
+PAGE_UPDATE_MODE = (os.environ.get("PAGE_UPDATE_MODE") or "diff").strip().lower()
 
-# 初始化Notion客户端
-notion = Client(auth=NOTION_TOKEN)
+# 使用共享的限速Notion客户端
+notion = notion_api.get_client(NOTION_TOKEN)
+
+# (父页面ID, 标题) -> 页面ID 的本地索引文件
+PAGE_INDEX_FILE = "page_index.json"
+# 写入日志：页面ID -> 内容哈希与已提交的批次，用于中断后续写
+WRITE_JOURNAL_FILE = "write_journal.json"
+WRITE_JOURNAL_MAX_AGE = 30 * 24 * 3600
+# 最近一次写入各页面的结果：created / updated / resumed / skipped / replaced / streamed / failed
+WRITE_STATUS = {}
+# 流式写入：写入线程空闲时，待写的块满一批（100 块）或距上次写入超过这么多秒才追加
+STREAM_FLUSH_SECONDS = float(os.environ.get("STREAM_FLUSH_SECONDS") or 5)
 
 """
 写入页面的脚本
 """
+def _normalize_id(object_id):
+    return (object_id or "").replace("-", "")
+
+def _page_index_key(parent_page_id, title):
+    return f"{_normalize_id(parent_page_id)}|{title}"
+
+def _page_index_get(parent_page_id, title):
+    index = local_store.load_json(PAGE_INDEX_FILE, {}) or {}
+    return index.get(_page_index_key(parent_page_id, title))
+
+def _page_index_put(parent_page_id, title, page_id):
+    def _put(index):
+        index = index or {}
+        index[_page_index_key(parent_page_id, title)] = page_id
+        return index
+    local_store.update_json(PAGE_INDEX_FILE, _put, {})
+
+def _page_index_remove(parent_page_id, title):
+    def _remove(index):
+        index = index or {}
+        index.pop(_page_index_key(parent_page_id, title), None)
+        return index
+    local_store.update_json(PAGE_INDEX_FILE, _remove, {})
+
+def _page_title(page):
+    """
+    读取页面对象的标题属性
+    """
+    for prop in (page.get("properties") or {}).values():
+        if prop.get("type") == "title":
+            return "".join(t.get("plain_text") or (t.get("text") or {}).get("content", "") for t in prop.get("title", []))
+    return ""
+
+def _page_matches(page, parent_page_id, title):
+    """
+    校验索引命中的页面仍然有效：未归档、父页面一致且标题一致
+    """
+    if page.get("archived") or page.get("in_trash"):
+        return False
+    parent = page.get("parent") or {}
+    if _normalize_id(parent.get("page_id")) != _normalize_id(parent_page_id):
+        return False
+    return _page_title(page) == title
+
+def _content_hash(title, summary):
+    return hashlib.sha256(f"{title}\n{summary or ''}".encode("utf-8")).hexdigest()
+
+def _journal_get(page_id):
+    journal = local_store.load_json(WRITE_JOURNAL_FILE, {}) or {}
+    return journal.get(_normalize_id(page_id))
+
+def _journal_update(page_id, **fields):
+    """
+    更新页面的写入日志条目，并清理过期条目
+    """
+    def _update(journal):
+        journal = journal or {}
+        now = time.time()
+        for k in [k for k, v in journal.items() if now - v.get("updated", 0) > WRITE_JOURNAL_MAX_AGE]:
+            journal.pop(k, None)
+        entry = journal.setdefault(_normalize_id(page_id), {})
+        entry.update(fields)
+        entry["updated"] = now
+        return journal
+    local_store.update_json(WRITE_JOURNAL_FILE, _update, {})
+
+def _append_batches(page_id, content_hash, batches, start):
+    """
+    从第 start 批开始追加，每提交一批记录一次日志
+    """
+    for i in range(start, len(batches)):
+        _append_children(page_id, batches[i])
+        _journal_update(page_id, hash=content_hash, total=len(batches), committed=i + 1, complete=False)
+    _journal_update(page_id, hash=content_hash, total=len(batches), committed=len(batches), complete=True, summary=None)
+
+def _resume_write(page_id, title, summary):
+    """
+    若该页面上一次写入相同内容时中途失败，则从第一个未提交的批次继续
+    
+    Returns:
+        bool: 是否已完成续写
+    """
+    entry = _journal_get(page_id)
+    content_hash = _content_hash(title, summary)
+    if not entry or entry.get("complete") or entry.get("hash") != content_hash:
+        return False
+    batches = list(block_compiler.iter_batches(block_compiler.iter_blocks(summary, title)))
+    start = int(entry.get("committed") or 0)
+    if entry.get("total") != len(batches) or start <= 0:
+        return False
+    print(f"📝 检测到未完成的写入，从第 {start + 1}/{len(batches)} 批继续")
+    _append_batches(page_id, content_hash, batches, start)
+    return True
+
+def write_incomplete(page_id):
+    """
+    页面上一次写入是否中途失败（页面上只有部分内容）
+    """
+    entry = _journal_get(page_id)
+    return bool(entry) and not entry.get("complete") and bool(entry.get("hash") or entry.get("pending"))
+
+def pending_summary(page_id, title):
+    """
+    取回页面上一次未写完的总结内容
+    
+    写入开始时总结全文随日志保存，写完后清除；重跑时用它续写，无需再次调用模型。
+    
+    Args:
+        page_id: 页面ID
+        title: 页面标题
+    
+    Returns:
+        str: 未写完的总结内容，没有可续写的内容时返回 None
+    """
+    entry = _journal_get(page_id)
+    if not entry or entry.get("complete"):
+        return None
+    summary = entry.get("summary")
+    if not summary or entry.get("hash") != _content_hash(title, summary):
+        return None
+    return summary
+
 def find_page_by_title(parent_page_id, title):
     """
     在指定父页面下查找具有相同标题的页面
     
+    优先使用本地索引（一次 pages.retrieve 校验），索引缺失或失效时回退为遍历子块/搜索，
+    找到后写回索引。
+    
     Args:
         parent_page_id: 父页面ID
         title: 要查找的页面标题
@@ -23,6 +167,24 @@ def find_page_by_title(parent_page_id, title):
     Returns:
         dict or None: 如果找到页面则返回页面信息，否则返回None
     """
+    cached_id = _page_index_get(parent_page_id, title)
+    if cached_id:
+        try:
+            page = notion.pages.retrieve(page_id=cached_id)
+            if _page_matches(page, parent_page_id, title):
+                return page
+        except Exception:
+            pass
+        _page_index_remove(parent_page_id, title)
+    page = _scan_page_by_title(parent_page_id, title)
+    if page and page.get("id"):
+        _page_index_put(parent_page_id, title, page.get("id"))
+    return page
+
+def _scan_page_by_title(parent_page_id, title):
+    """
+    遍历父页面子块并回退到搜索来查找页面
+    """
     try:
         # 1. 直接查询父页面下的所有子页面（最可靠的方法）
         has_more = True
@@ -96,138 +258,310 @@ def get_page_content(page_id):
         str: 页面内容
     """
     try:
-        blocks = notion.blocks.children.list(block_id=page_id)
+        # 读取完整块树（分页、折叠块与嵌套列表），嵌套内容按深度缩进
         content = []
-        for block in blocks.get("results", []):
-            block_type = block.get("type")
-            if block_type == "paragraph":
-                text_parts = block.get("paragraph", {}).get("rich_text", [])
-                content.append(" ".join(part.get("text", {}).get("content", "") for part in text_parts))
+        for depth, block in notion_api.iter_block_tree(page_id, client=notion):
+            line = notion_api.block_text(block)
+            if line:
+                content.append("  " * depth + line)
         return "\n".join(content)
     except Exception as e:
         print(f"获取页面内容失败: {e}")
         return ""
 
-def update_page_content(page_id, summary, heading_title=None):
+def _list_all_children(block_id):
+    """
+    分页获取块的全部一级子块
+    """
+    return notion_api.list_children(block_id, client=notion)
+
+def _block_fingerprint(block):
+    """
+    计算块指纹：块类型 + 富文本（文本、链接、粗体/斜体/代码）的哈希
+    
+    已有块（API返回）与新编译块的富文本结构不同，这里只取两者共有的字段进行比较。
+    """
+    t = block.get("type")
+    data = block.get(t) or {}
+    parts = []
+    for part in data.get("rich_text") or []:
+        text = part.get("text") or {}
+        ann = part.get("annotations") or {}
+        parts.append([
+            text.get("content", part.get("plain_text", "")),
+            (text.get("link") or {}).get("url"),
+            bool(ann.get("bold")),
+            bool(ann.get("italic")),
+            bool(ann.get("code")),
+        ])
+    key = json.dumps(parts, ensure_ascii=False)
+    return f"{t}:{hashlib.sha1(key.encode('utf-8')).hexdigest()}"
+
+def _can_update_in_place(old_block, new_block):
+    """
+    类型相同、均含富文本且旧块没有子块时，可以用 blocks.update 原地更新
+    """
+    t = new_block.get("type")
+    return (
+        old_block.get("type") == t
+        and "rich_text" in (new_block.get(t) or {})
+        and not old_block.get("has_children")
+    )
+
+def _append_children(page_id, batch, after=None):
+    """
+    追加一批块并返回新增的块
+    
+    追加是非幂等写入，超时或 5xx 时首次请求可能已经生效：先重新读取子块，
+    这批块已出现在预期位置时视为成功，否则再追加一次。
+    """
+    params = {"block_id": page_id, "children": batch}
+    if after:
+        params["after"] = after
+    try:
+        return notion.blocks.children.append(**params).get("results", [])
+    except Exception as e:
+        if not notion_api.is_unconfirmed_write(e):
+            raise
+        print(f"⚠️ 追加块的结果未确认，重新读取页面: {e}")
+    existing = _list_all_children(page_id)
+    ids = [_normalize_id(b.get("id")) for b in existing]
+    if after:
+        start = ids.index(_normalize_id(after)) + 1 if _normalize_id(after) in ids else -1
+    else:
+        start = len(existing) - len(batch)
+    run = existing[start:start + len(batch)] if start >= 0 else []
+    if len(run) == len(batch) and [_block_fingerprint(b) for b in run] == [_block_fingerprint(b) for b in batch]:
+        print("✅ 上次追加已生效，不再重复写入")
+        return run
+    return notion.blocks.children.append(**params).get("results", [])
+
+def _create_child_page(parent_page_id, title, children, exclude=None):
+    """
+    在父页面下创建子页面
+    
+    创建是非幂等写入，超时或 5xx 时首次请求可能已经生效：先在父页面的子块中查找同名页面
+    （排除 exclude，即将被替换的旧页面），找到则直接使用，否则再创建一次。
+    """
+    params = {
+        "parent": {"page_id": parent_page_id},
+        "properties": {"title": [{"type": "text", "text": {"content": title}}]},
+        "children": children,
+    }
+    try:
+        return notion.pages.create(**params)
+    except Exception as e:
+        if not notion_api.is_unconfirmed_write(e):
+            raise
+        print(f"⚠️ 创建页面的结果未确认，重新读取父页面: {e}")
+    candidates = [
+        b for b in _list_all_children(parent_page_id)
+        if b.get("type") == "child_page"
+        and (b.get("child_page") or {}).get("title") == title
+        and _normalize_id(b.get("id")) != _normalize_id(exclude)
+    ]
+    if candidates:
+        print("✅ 上次创建已生效，不再重复创建")
+        # 新页面追加在父页面末尾
+        return notion.pages.retrieve(page_id=candidates[-1].get("id"))
+    return notion.pages.create(**params)
+
+def _insert_after(page_id, anchor_id, blocks):
+    """
+    在 anchor_id 之后按顺序插入块，返回最后一个插入块的ID
+    """
+    for batch in block_compiler.iter_batches(blocks):
+        results = _append_children(page_id, batch, anchor_id)
+        if anchor_id and len(results) != len(batch):
+            # 带 after 追加时，部分版本的 API 返回整页子块而非仅新增块，按位置定位
+            ids = [b.get("id") for b in results]
+            if anchor_id in ids:
+                pos = ids.index(anchor_id) + len(batch)
+                anchor_id = ids[pos] if pos < len(ids) else (ids[-1] if ids else anchor_id)
+            elif results:
+                anchor_id = results[-1].get("id")
+        elif results:
+            anchor_id = results[-1].get("id")
+    return anchor_id
+
+def _diff_update_children(page_id, children_all):
+    """
+    按块差异增量更新页面：只对变化部分发出删除、插入（after）与原地更新请求
+    
+    Args:
+        page_id: 页面ID
+        children_all: 新内容编译得到的块列表
+    
+    Returns:
+        dict or None: 各类操作计数；无法安全增量更新（如需在页首插入）时返回None
+    """
+    existing = _list_all_children(page_id)
+    old_fp = [_block_fingerprint(b) for b in existing]
+    new_fp = [_block_fingerprint(b) for b in children_all]
+    opcodes = difflib.SequenceMatcher(None, old_fp, new_fp, autojunk=False).get_opcodes()
+
+    # Notion 的 after 参数无法插入到页首；首段变化且后面还有保留块时交给全量重写
+    if len(opcodes) > 1:
+        tag, i1, i2, j1, j2 = opcodes[0]
+        if tag == "insert" or (tag == "replace" and not _can_update_in_place(existing[i1], children_all[j1])):
+            return None
+
+    stats = {"kept": 0, "updated": 0, "deleted": 0, "inserted": 0}
+    anchor = None
+    for tag, i1, i2, j1, j2 in opcodes:
+        if tag == "equal":
+            stats["kept"] += i2 - i1
+            anchor = existing[i2 - 1].get("id")
+            continue
+        olds = existing[i1:i2]
+        news = children_all[j1:j2]
+        paired = 0
+        if tag == "replace":
+            while paired < min(len(olds), len(news)) and _can_update_in_place(olds[paired], news[paired]):
+                t = news[paired]["type"]
+                notion.blocks.update(block_id=olds[paired].get("id"), **{t: news[paired][t]})
+                anchor = olds[paired].get("id")
+                stats["updated"] += 1
+                paired += 1
+        for b in olds[paired:]:
+            notion.blocks.delete(block_id=b.get("id"))
+            stats["deleted"] += 1
+        rest = news[paired:]
+        if rest:
+            anchor = _insert_after(page_id, anchor, rest)
+            stats["inserted"] += len(rest)
+    return stats
+
+def update_page_content(page_id, summary, heading_title=None, mode=None):
     """
     更新页面内容
     
     Args:
         page_id: 页面ID
         summary: 新的页面内容
+        heading_title: 页面首个标题块的文字
+        mode: 原地更新的模式，默认取 PAGE_UPDATE_MODE：
+            "diff"：按块差异增量更新，无法安全增量更新时回退为全量重写；
+            "rewrite"：删除全部旧块后重写。
+            "replace" 会改变页面ID，不能原地执行，请使用 replace_page
+    
+    Returns:
+        bool: 是否更新成功
+    
+    Raises:
+        ValueError: 更新模式不是 "diff" 或 "rewrite"
     """
+    mode = mode or PAGE_UPDATE_MODE
+    if mode == "replace":
+        raise ValueError("replace 模式会新建页面，不能原地更新，请使用 replace_page")
+    if mode not in ("diff", "rewrite"):
+        raise ValueError(f"未知的页面更新模式: {mode}")
     try:
-        blocks = notion.blocks.children.list(block_id=page_id)
-        for block in blocks.get("results", []):
-            notion.blocks.delete(block_id=block.get("id"))
         today = datetime.now().strftime("%Y-%m-%d")
         title = heading_title or f"每日总结 - {today}"
-        def _chunks(text, limit=1800):
-            res = []
-            i = 0
-            n = len(text)
-            while i < n:
-                res.append(text[i:i+limit])
-                i += limit
-            return res
-        def _append_text_block(children, t, content):
-            for c in _chunks(content):
-                if t == "divider":
-                    children.append({"object":"block","type":"divider","divider":{}})
-                else:
-                    import re
-                    def _inline_rich_text(s):
-                        parts = []
-                        pattern = re.compile(r"(\[([^\]]+)\]\(([^)]+)\))|(\*\*([^\*]+)\*\*)|(`([^`]+)`)|(\*([^*]+)\*)|(_([^_]+)_)")
-                        pos = 0
-                        for m in pattern.finditer(s):
-                            start, end = m.span()
-                            if start > pos:
-                                parts.append({
-                                    "type": "text",
-                                    "text": {"content": s[pos:start]}
-                                })
-                            if m.group(2) and m.group(3):
-                                parts.append({
-                                    "type": "text",
-                                    "text": {"content": m.group(2), "link": {"url": m.group(3)}}
-                                })
-                            elif m.group(5):
-                                parts.append({
-                                    "type": "text",
-                                    "text": {"content": m.group(5)},
-                                    "annotations": {"bold": True}
-                                })
-                            elif m.group(7):
-                                parts.append({
-                                    "type": "text",
-                                    "text": {"content": m.group(7)},
-                                    "annotations": {"code": True}
-                                })
-                            elif m.group(9):
-                                parts.append({
-                                    "type": "text",
-                                    "text": {"content": m.group(9)},
-                                    "annotations": {"italic": True}
-                                })
-                            elif m.group(11):
-                                parts.append({
-                                    "type": "text",
-                                    "text": {"content": m.group(11)},
-                                    "annotations": {"italic": True}
-                                })
-                            pos = end
-                        if pos < len(s):
-                            parts.append({
-                                "type": "text",
-                                "text": {"content": s[pos:]}
-                            })
-                        return parts
-                    children.append({
-                        "object": "block",
-                        "type": t,
-                        t: {
-                            "rich_text": _inline_rich_text(c)
-                        }
-                    })
-        def _line_block_type(p):
-            if p.startswith("### "):
-                return "heading_3", p[4:]
-            if p.startswith("## "):
-                return "heading_2", p[3:]
-            if p.startswith("# "):
-                return "heading_1", p[2:]
-            if p in ("---", "———", "___"):
-                return "divider", ""
-            if p.startswith(">"):
-                return "quote", p[1:].strip()
-            import re
-            if re.match(r"^\d+\.\s+", p):
-                return "numbered_list_item", re.sub(r"^\d+\.\s+", "", p)
-            if p.startswith("- ") or p.startswith("* ") or p.startswith("• "):
-                return "bulleted_list_item", p[2:].strip()
-            return "paragraph", p
-        children_all = [{
-            "object": "block",
-            "type": "heading_1",
-            "heading_1": {"rich_text": [{"type": "text", "text": {"content": title}}]}
-        }]
-        for line in summary.split("\n"):
-            p = line.strip()
-            if not p:
-                continue
-            t, content = _line_block_type(p)
-            _append_text_block(children_all, t, content)
-        i = 0
-        while i < len(children_all):
-            batch = children_all[i:i+90]
-            notion.blocks.children.append(block_id=page_id, children=batch)
-            i += 90
+        children_all = block_compiler.compile_blocks(summary, title)
+        if mode == "diff":
+            try:
+                stats = _diff_update_children(page_id, children_all)
+                if stats is not None:
+                    _journal_update(page_id, hash=_content_hash(title, summary), total=None, committed=None, complete=True)
+                    print(f"增量更新完成: 保留 {stats['kept']}，更新 {stats['updated']}，删除 {stats['deleted']}，新增 {stats['inserted']}")
+                    return True
+            except Exception as e:
+                print(f"增量更新失败，回退为全量重写: {e}")
+        for block in _list_all_children(page_id):
+            notion.blocks.delete(block_id=block.get("id"))
+        batches = list(block_compiler.iter_batches(children_all))
+        _journal_update(page_id, hash=_content_hash(title, summary), total=len(batches), committed=0, complete=False, summary=summary)
+        _append_batches(page_id, _content_hash(title, summary), batches, 0)
         return True
     except Exception as e:
         print(f"更新页面内容失败: {e}")
         return False
 
+def _create_page(parent_page_id, title, summary, replaces=None):
+    """
+    创建子页面并写入全部内容（首批随 pages.create 提交，其余按批追加）
+    
+    Args:
+        parent_page_id: 父页面ID
+        title: 页面标题
+        summary: 页面内容
+        replaces: 可选，新页面写完后需要归档的旧页面ID
+    
+    Returns:
+        str: 新页面ID
+    """
+    content_hash = _content_hash(title, summary)
+    batches = list(block_compiler.iter_batches(block_compiler.iter_blocks(summary, title)))
+    initial = batches[0] if batches else []
+    created = _create_child_page(parent_page_id, title, initial, exclude=replaces)
+    page_id = created.get("id")
+    _page_index_put(parent_page_id, title, page_id)
+    _journal_update(page_id, hash=content_hash, total=len(batches), committed=1, complete=False, replaces=replaces, summary=summary)
+    _append_batches(page_id, content_hash, batches, 1)
+    return page_id
+
+def _finish_replace(page_id, parent_page_id, title):
+    """
+    新页面写完后归档其替换的旧页面
+    """
+    entry = _journal_get(page_id) or {}
+    old_id = entry.get("replaces")
+    if not old_id:
+        return
+    try:
+        notion.pages.update(page_id=old_id, archived=True)
+        _journal_update(page_id, replaces=None)
+        _journal_update(_page_index_key(parent_page_id, title), replaces=None)
+    except Exception as e:
+        print(f"归档旧页面失败 {old_id}: {e}")
+
+def _archive_pending_replace(parent_page_id, title, keep=None):
+    """
+    归档同一标题上一次被中断的替换遗留下的旧页面
+    
+    替换开始前按标题在写入日志中记录旧页面ID。新页面未写完就中断、下次又生成了不同的内容时，
+    半成品页面会被再次替换或原地更新，最初的旧页面不会经由 _finish_replace 归档，需在此归档。
+    
+    Args:
+        parent_page_id: 父页面ID
+        title: 页面标题
+        keep: 可选，仍在使用、不应归档的页面ID
+    """
+    key = _page_index_key(parent_page_id, title)
+    old_id = (_journal_get(key) or {}).get("replaces")
+    if not old_id or _normalize_id(old_id) == _normalize_id(keep):
+        return
+    print(f"📝 归档上次未完成替换遗留的旧页面: {old_id}")
+    try:
+        notion.pages.update(page_id=old_id, archived=True)
+        _journal_update(key, replaces=None)
+    except Exception as e:
+        print(f"归档旧页面失败 {old_id}: {e}")
+
+def replace_page(old_page_id, parent_page_id, title, summary):
+    """
+    以替换方式更新页面：新建包含完整内容的页面，再归档旧页面
+    
+    调用次数只与新内容的批次数有关，与旧页面的块数无关，也不会残留旧块。
+    
+    Args:
+        old_page_id: 要替换的页面ID
+        parent_page_id: 父页面ID
+        title: 页面标题
+        summary: 新的页面内容
+    
+    Returns:
+        str: 新页面ID
+    """
+    print(f"📝 以替换方式更新页面: {title}")
+    _archive_pending_replace(parent_page_id, title, keep=old_page_id)
+    _journal_update(_page_index_key(parent_page_id, title), replaces=old_page_id)
+    page_id = _create_page(parent_page_id, title, summary, replaces=old_page_id)
+    _finish_replace(page_id, parent_page_id, title)
+    return page_id
+
 def create_daily_summary(summary, existing_ideas_content=None, parent_page_id=None, title_override=None):
     """
     创建或更新每日总结页面
@@ -252,131 +586,136 @@ def create_daily_summary(summary, existing_ideas_content=None, parent_page_id=No
             print(f"📝 已存在相同标题的页面，正在更新页面: {title}")
             page_id = existing_page.get("id")
             
-            # 更新页面内容
-            update_page_content(page_id, summary, heading_title=title)
+            entry = _journal_get(page_id)
+            # 上次流式写入中断且未能归档：归档未写完的页面后重新创建
+            if entry and entry.get("pending") and not entry.get("complete"):
+                print(f"📝 发现中断的流式写入页面，归档后重新创建: {title}")
+                notion.pages.update(page_id=page_id, archived=True)
+                _page_index_remove(parent_page_id or DIARY_PARENT_PAGE_ID, title)
+                page_id = _create_page(parent_page_id or DIARY_PARENT_PAGE_ID, title, summary)
+                WRITE_STATUS[page_id] = "created"
+                return page_id
+            
+            # 内容与上次完整写入的一致时直接跳过，不发出任何块请求
+            if entry and entry.get("complete") and entry.get("hash") == _content_hash(title, summary):
+                print(f"⏭️ 页面内容未变化，跳过写入: {title}")
+                WRITE_STATUS[page_id] = "skipped"
+                return page_id
+            
+            # 上次写入中断时续写，否则更新页面内容
+            if _resume_write(page_id, title, summary):
+                _finish_replace(page_id, parent_page_id or DIARY_PARENT_PAGE_ID, title)
+                WRITE_STATUS[page_id] = "resumed"
+            elif PAGE_UPDATE_MODE == "replace":
+                page_id = replace_page(page_id, parent_page_id or DIARY_PARENT_PAGE_ID, title, summary)
+                WRITE_STATUS[page_id] = "replaced"
+            else:
+                ok = update_page_content(page_id, summary, heading_title=title)
+                if ok:
+                    # 原地更新的可能是上次替换中断留下的新页面，其替换的旧页面需一并归档
+                    _archive_pending_replace(parent_page_id or DIARY_PARENT_PAGE_ID, title, keep=page_id)
+                WRITE_STATUS[page_id] = "updated" if ok else "failed"
             return page_id
         else:
             # 页面不存在，创建新页面
             print(f"📝 页面不存在，正在创建新页面: {title}")
-            def _chunks(text, limit=1800):
-                res = []
-                i = 0
-                n = len(text)
-                while i < n:
-                    res.append(text[i:i+limit])
-                    i += limit
-                return res
-            def _append_text_block(children, t, content):
-                for c in _chunks(content):
-                    if t == "divider":
-                        children.append({"object":"block","type":"divider","divider":{}})
-                    else:
-                        import re
-                        def _inline_rich_text(s):
-                            parts = []
-                            pattern = re.compile(r"(\[([^\]]+)\]\(([^)]+)\))|(\*\*([^\*]+)\*\*)|(`([^`]+)`)|(\*([^*]+)\*)|(_([^_]+)_)")
-                            pos = 0
-                            for m in pattern.finditer(s):
-                                start, end = m.span()
-                                if start > pos:
-                                    parts.append({
-                                        "type": "text",
-                                        "text": {"content": s[pos:start]}
-                                    })
-                                if m.group(2) and m.group(3):
-                                    parts.append({
-                                        "type": "text",
-                                        "text": {"content": m.group(2), "link": {"url": m.group(3)}}
-                                    })
-                                elif m.group(5):
-                                    parts.append({
-                                        "type": "text",
-                                        "text": {"content": m.group(5)},
-                                        "annotations": {"bold": True}
-                                    })
-                                elif m.group(7):
-                                    parts.append({
-                                        "type": "text",
-                                        "text": {"content": m.group(7)},
-                                        "annotations": {"code": True}
-                                    })
-                                elif m.group(9):
-                                    parts.append({
-                                        "type": "text",
-                                        "text": {"content": m.group(9)},
-                                        "annotations": {"italic": True}
-                                    })
-                                elif m.group(11):
-                                    parts.append({
-                                        "type": "text",
-                                        "text": {"content": m.group(11)},
-                                        "annotations": {"italic": True}
-                                    })
-                                pos = end
-                            if pos < len(s):
-                                parts.append({
-                                    "type": "text",
-                                    "text": {"content": s[pos:]}
-                                })
-                            return parts
-                        children.append({
-                            "object": "block",
-                            "type": t,
-                            t: {
-                                "rich_text": _inline_rich_text(c)
-                            }
-                        })
-            def _line_block_type(p):
-                if p.startswith("### "):
-                    return "heading_3", p[4:]
-                if p.startswith("## "):
-                    return "heading_2", p[3:]
-                if p.startswith("# "):
-                    return "heading_1", p[2:]
-                if p in ("---", "———", "___"):
-                    return "divider", ""
-                if p.startswith(">"):
-                    return "quote", p[1:].strip()
-                import re
-                if re.match(r"^\d+\.\s+", p):
-                    return "numbered_list_item", re.sub(r"^\d+\.\s+", "", p)
-                if p.startswith("- ") or p.startswith("* ") or p.startswith("• "):
-                    return "bulleted_list_item", p[2:].strip()
-                return "paragraph", p
-            children_all = [{
-                "object": "block",
-                "type": "heading_1",
-                "heading_1": {"rich_text": [{"type": "text", "text": {"content": title}}]}
-            }]
-            for line in summary.split("\n"):
-                p = line.strip()
-                if not p:
-                    continue
-                t, content = _line_block_type(p)
-                _append_text_block(children_all, t, content)
-            initial = children_all[:90]
-            created = notion.pages.create(
-                parent={"page_id": parent_page_id or DIARY_PARENT_PAGE_ID},
-                properties={
-                    "title": [
-                        {
-                            "type": "text",
-                            "text": {"content": title}
-                        }
-                    ]
-                },
-                children=initial
-            )
-            page_id = created.get("id")
-            i = 90
-            while i < len(children_all):
-                batch = children_all[i:i+90]
-                notion.blocks.children.append(block_id=page_id, children=batch)
-                i += 90
+            page_id = _create_page(parent_page_id or DIARY_PARENT_PAGE_ID, title, summary)
+            WRITE_STATUS[page_id] = "created"
             return page_id
     except Exception as e:
         raise Exception(f"创建/更新每日总结页面失败: {str(e)}")
 
+def stream_daily_summary(chunks, parent_page_id=None, title_override=None):
+    """
+    边生成边写入每日总结页面
+    
+    文本片段（如模型的流式输出）经增量编译为块，由一个后台线程按顺序写入：首批随 pages.create 提交，
+    之后每当写入线程空闲、且待写的块已满一批或距上次写入超过 STREAM_FLUSH_SECONDS 秒时，
+    将待写的块按 iter_batches 装箱后追加，模型生成与 Notion 写入同时进行。
+    
+    只在页面尚不存在时流式写入；已有同名页面（包括上次中断的流式写入）时等完整内容生成后交给
+    create_daily_summary，内容未变化时跳过写入。中途失败会归档未写完的页面并抛出异常，
+    调用方可回退到非流式写入；未能归档时写入日志中的 pending 标记会让下次写入先归档该页面。
+    
+    Args:
+        chunks: 文本片段序列（生成器）
+        parent_page_id: 父页面ID，默认使用配置的DIARY_PARENT_PAGE_ID
+        title_override: 可选，页面标题
+    
+    Returns:
+        tuple: (页面ID, 完整的总结文本)
+    """
+    today = datetime.now().strftime("%Y-%m-%d")
+    title = title_override or f"股市总结 - {today}"
+    parent = parent_page_id or DIARY_PARENT_PAGE_ID
+    if find_page_by_title(parent, title):
+        summary = "".join(chunks)
+        if not summary.strip():
+            raise Exception("模型返回为空")
+        return create_daily_summary(summary, parent_page_id=parent, title_override=title), summary
+    
+    parts = []
+    
+    def _text():
+        for chunk in chunks:
+            parts.append(chunk)
+            yield chunk
+    
+    state = {"page_id": None, "requests": 0}
+    
+    def _write(blocks):
+        for batch in block_compiler.iter_batches(blocks):
+            if state["page_id"] is None:
+                state["page_id"] = _create_child_page(parent, title, batch).get("id")
+                _page_index_put(parent, title, state["page_id"])
+                _journal_update(state["page_id"], hash=None, complete=False, pending=True)
+            else:
+                _append_children(state["page_id"], batch)
+            state["requests"] += 1
+    
+    print(f"📝 正在流式写入页面: {title}")
+    pending = []
+    inflight = None
+    last_flush = time.monotonic()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=1) as writer:
+        try:
+            for block in block_compiler.iter_stream_blocks(_text(), title):
+                pending.append(block)
+                if inflight is not None:
+                    if not inflight.done():
+                        continue
+                    # 尽早发现写入失败，避免继续消耗模型输出
+                    inflight.result()
+                if len(pending) >= block_compiler.MAX_BLOCKS_PER_REQUEST or time.monotonic() - last_flush >= STREAM_FLUSH_SECONDS:
+                    inflight = writer.submit(_write, pending)
+                    pending = []
+                    last_flush = time.monotonic()
+            summary = "".join(parts)
+            if not summary.strip():
+                raise Exception("模型返回为空")
+            if inflight is not None:
+                inflight.result()
+            if pending:
+                writer.submit(_write, pending).result()
+        except Exception:
+            if inflight is not None:
+                concurrent.futures.wait([inflight])
+            if state["page_id"]:
+                try:
+                    notion.pages.update(page_id=state["page_id"], archived=True)
+                    _page_index_remove(parent, title)
+                    _journal_update(state["page_id"], pending=False)
+                except Exception as e:
+                    print(f"归档未写完的页面失败 {state['page_id']}: {e}")
+            raise
+    
+    page_id = state["page_id"]
+    total = sum(1 for _ in block_compiler.iter_batches(block_compiler.iter_blocks(summary, title)))
+    _journal_update(page_id, hash=_content_hash(title, summary), total=total, committed=total, complete=True, pending=False, summary=None)
+    WRITE_STATUS[page_id] = "streamed"
+    print(f"✅ 流式写入完成，共 {state['requests']} 次写入请求")
+    return page_id, summary
+
 def create_market_analysis(summary, parent_page_id=None):
     """
     创建或更新市场分析页面
@@ -1,11 +1,74 @@
 import os
+import re
 import json
+import math
+import hashlib
+import email.utils
 import requests
+import requests.adapters
 import time
+import queue
+import random
+import threading
+import concurrent.futures
+import local_store
+import block_compiler
 
 # 从环境变量获取配置
 OPENAI_API_KEY = os.environ.get("OPENAI_API_KEY") or os.environ.get("DASHSCOPE_API_KEY")
 QWEN_MODEL = os.environ.get("QWEN_MODEL", "qwen-turbo")
+# 模型响应缓存：同一天重跑（如写入失败后重试、手动触发）时相同的请求直接复用上次结果
+LLM_CACHE_DIR = "llm_cache"
+LLM_CACHE_MAX_AGE = float(os.environ.get("LLM_CACHE_MAX_AGE_HOURS") or 36) * 3600
+LLM_CACHE_MAX_BYTES = int(float(os.environ.get("LLM_CACHE_MAX_MB") or 50) * 1024 * 1024)
+# 设为 1 时跳过缓存读取（仍会写入新的结果）
+LLM_CACHE_BYPASS = (os.environ.get("LLM_CACHE_BYPASS") or "").lower() in ("1", "true", "yes")
+# 设为 1 时每日总结使用流式输出，边生成边写入 Notion
+LLM_STREAM = (os.environ.get("LLM_STREAM") or "").lower() in ("1", "true", "yes")
+# 调用方式：auto（可导入 dashscope 时使用 SDK，否则 HTTP）、sdk、http；进程启动后只确定一次
+LLM_TRANSPORT = os.environ.get("LLM_TRANSPORT") or "auto"
+QWEN_GENERATION_URL = "https://dashscope.aliyuncs.com/api/v1/services/aigc/text-generation/generation"
+QWEN_COMPATIBLE_URL = "https://dashscope.aliyuncs.com/compatible-mode/v1/chat/completions"
+# 单次 HTTP 请求的超时（秒）与最多尝试次数；重试间隔为带随机抖动的指数退避，有 Retry-After 时优先遵循
+LLM_TIMEOUT = float(os.environ.get("LLM_TIMEOUT") or 60)
+LLM_RETRIES = int(os.environ.get("LLM_RETRIES") or 3)
+LLM_RETRY_MAX_DELAY = 30.0
+# 对冲请求：设为 1 时，超过历史耗时的 LLM_HEDGE_PERCENTILE 分位仍未返回，就再发一份相同请求，取先返回的结果
+LLM_HEDGE = (os.environ.get("LLM_HEDGE") or "").lower() in ("1", "true", "yes")
+LLM_HEDGE_PERCENTILE = float(os.environ.get("LLM_HEDGE_PERCENTILE") or 95)
+# 样本不足时使用的对冲阈值（秒），以及阈值下限
+LLM_HEDGE_DEFAULT_SECONDS = float(os.environ.get("LLM_HEDGE_DEFAULT_SECONDS") or 20)
+LLM_HEDGE_MIN_SECONDS = float(os.environ.get("LLM_HEDGE_MIN_SECONDS") or 3)
+# 每次尝试的耗时记录（位于本地缓存目录，跨运行累积），每个 (模型, 调用类型) 保留最近的样本数
+LLM_LATENCY_FILE = "llm_latency.json"
+LLM_LATENCY_SAMPLES = 200
+_HEDGE_MIN_SAMPLES = 10
+# 并发调用模型的最大请求数（多段分析并行执行）
+LLM_MAX_CONCURRENCY = int(os.environ.get("LLM_MAX_CONCURRENCY") or 4)
+# 某些分段调用失败时，报告开头的一行提示；每个失败分段只列出序号与错误类型，完整错误只打印到日志
+LLM_FAILURE_NOTICE = "> ⚠️ 共 {total} 部分，以下报告未包含分析失败的部分：{markers}"
+LLM_FAILURE_MARKER = "第 {index} 部分（{error_type}）"
+# 各模型的上下文窗口（token，按模型名前缀匹配）；LLM_CONTEXT_TOKENS 大于 0 时覆盖所有模型
+MODEL_CONTEXT_TOKENS = {
+    "qwen-mt": 8192,
+    "qwen-turbo": 131072,
+    "qwen-plus": 131072,
+    "qwen-max": 32768,
+    "qwen-long": 1000000,
+}
+DEFAULT_CONTEXT_TOKENS = 32768
+LLM_CONTEXT_TOKENS = int(os.environ.get("LLM_CONTEXT_TOKENS") or 0)
+# 每次调用的输入 + 系统提示词 + 输出占上下文窗口的比例
+LLM_CONTEXT_FILL = float(os.environ.get("LLM_CONTEXT_FILL") or 0.9)
+LLM_MAX_OUTPUT_TOKENS = int(os.environ.get("LLM_MAX_OUTPUT_TOKENS") or 2000)
+# 每字符 token 数的保守估计（汉字及全角符号, ASCII 字母与空白, ASCII 数字与标点）；其余字符按 1 计
+# 数字通常逐位切分、标点很少与相邻字符合并，行情数据中大量的价格、涨跌幅按字母的比例会严重低估
+MODEL_TOKEN_RATES = {
+    "qwen": (1.0, 0.3, 1.0),
+}
+DEFAULT_TOKEN_RATES = (1.5, 0.35, 1.0)
+_CJK_PATTERN = re.compile(r"[\u3000-\u303f\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff\uff00-\uffef]")
+_ASCII_SYMBOL_PATTERN = re.compile(r"[0-9!-/:-@\[-`{-~]")
 
 ANALYST_SYSTEM_PROMPT = """
 角色定义：A股实战型市场策略师（复盘 & 决策导向）
@@ -438,68 +501,688 @@ A股市场深度理解
 不使用煽动性语言刺激交易冲动
 当你分析新闻时，首先判断其对A股市场的实质性影响，然后构建完整的产业链映射图，识别受益最直接、弹性最大的环节，最后提供风险可控、逻辑清晰的投资思路。所有分析必须基于公开信息，避免任何内幕交易暗示。在提供机会的同时，必须同等重视风险提示，确保投资者全面理解潜在风险。"""
 
+MKT_TRANS_PROMPT = "将以下英文新闻逐条精准翻译为中文。仅翻译，不添加任何分析或拓展，保留段落结构，逐条输出，以【标题】起始并跟随正文。"
+
+
+def _system_prompt(type=None, model=None):
+    """
+    按调用类型选择系统提示词（qwen-mt 翻译不使用系统提示词）
+    """
+    if type == "MKT_TRANS" and "qwen-mt" in (model or ""):
+        return ""
+    if type == "MKT":
+        return MKT_SYSTEM_PROMPT
+    if type == "KX":
+        return KX_SYSTEM_PROMPT
+    if type == "MKT_TRANS":
+        return MKT_TRANS_PROMPT
+    return ANALYST_SYSTEM_PROMPT
+
+
+def _sha256(text):
+    return hashlib.sha256((text or "").encode("utf-8")).hexdigest()
+
+
+def _generation_params(type, model):
+    """
+    生成参数（请求模板与响应缓存键共用，修改后旧的缓存响应自动失效）
+    """
+    if type == "MKT_TRANS" and "qwen-mt" in model:
+        return {"translation_options": {"source_lang": "auto", "target_lang": "Chinese"}}
+    return {"temperature": 0.7, "max_tokens": LLM_MAX_OUTPUT_TOKENS, "result_format": "message"}
+
+
+def _llm_cache_key(model, type, system_prompt, content):
+    """
+    缓存键：模型 + 调用类型 + 生成参数 + 系统提示词哈希 + 内容哈希
+    """
+    params = json.dumps(_generation_params(type, model), sort_keys=True)
+    return _sha256(f"{model}\n{type or ''}\n{params}\n{_sha256(system_prompt)}\n{_sha256(content)}")
+
+
+def _llm_cache_path(key):
+    directory = local_store.path_for(LLM_CACHE_DIR)
+    os.makedirs(directory, exist_ok=True)
+    return os.path.join(directory, f"{key}.json")
+
+
+def _llm_cache_get(key):
+    """
+    读取未过期的缓存响应，不存在或已过期时返回 None
+    """
+    path = _llm_cache_path(key)
+    try:
+        if time.time() - os.path.getmtime(path) > LLM_CACHE_MAX_AGE:
+            return None
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f).get("text")
+    except Exception:
+        return None
+
+
+def _llm_cache_evict():
+    """
+    删除过期的缓存文件，总大小超过上限时从最旧的开始删除
+    """
+    directory = local_store.path_for(LLM_CACHE_DIR)
+    entries = []
+    now = time.time()
+    for name in os.listdir(directory):
+        path = os.path.join(directory, name)
+        try:
+            st = os.stat(path)
+        except OSError:
+            continue
+        if now - st.st_mtime > LLM_CACHE_MAX_AGE:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            continue
+        entries.append((st.st_mtime, st.st_size, path))
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= LLM_CACHE_MAX_BYTES:
+            break
+        try:
+            os.remove(path)
+            total -= size
+        except OSError:
+            pass
+
+
+def _llm_cache_put(key, text, model, type):
+    """
+    原子写入缓存响应，并执行淘汰
+    """
+    try:
+        path = _llm_cache_path(key)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"model": model, "type": type, "text": text, "at": time.time()}, f, ensure_ascii=False)
+        os.replace(tmp, path)
+        _llm_cache_evict()
+    except Exception as e:
+        print(f"写入模型响应缓存失败: {e}")
+
+
 """
 调用千问API生成总结
 """
-def call_qwen_api(content, type=None, model=None):
+def call_qwen_api(content, type=None, model=None, use_cache=None):
+    """
+    调用千问API生成总结，相同请求优先返回本地缓存的响应
+    
+    Args:
+        content: 用户消息内容
+        type: 调用类型（MKT、KX、MKT_TRANS，默认想法总结）
+        model: 模型名称，默认 QWEN_MODEL
+        use_cache: 是否读取缓存，默认由 LLM_CACHE_BYPASS 决定；为 False 时仍会写入新结果
+    
+    Returns:
+        str: 模型输出文本
+    """
+    m = model or QWEN_MODEL
+    if use_cache is None:
+        use_cache = not LLM_CACHE_BYPASS
+    key = _llm_cache_key(m, type, _system_prompt(type, m), content)
+    if use_cache:
+        cached = _llm_cache_get(key)
+        if cached:
+            print(f"♻️ 命中模型响应缓存（{m}，{type or '总结'}）")
+            return cached
+    text = _call_qwen_api(content, type=type, model=m)
+    if text:
+        _llm_cache_put(key, text, m, type)
+    return text
+
+
+def stream_qwen_api(content, type=None, model=None, use_cache=None):
     """
-    调用千问API生成总结（优先使用DashScope SDK，其次HTTP）
+    流式调用千问API，逐段产出生成的文本；完整输出结束后写入响应缓存
+    
+    Args:
+        content: 用户消息内容
+        type: 调用类型，同 call_qwen_api
+        model: 模型名称，默认 QWEN_MODEL
+        use_cache: 是否读取缓存，同 call_qwen_api（命中时一次性产出缓存的全文）
+    
+    Yields:
+        str: 新生成的文本片段
     """
+    m = model or QWEN_MODEL
+    if use_cache is None:
+        use_cache = not LLM_CACHE_BYPASS
+    key = _llm_cache_key(m, type, _system_prompt(type, m), content)
+    if use_cache:
+        cached = _llm_cache_get(key)
+        if cached:
+            print(f"♻️ 命中模型响应缓存（{m}，{type or '总结'}）")
+            yield cached
+            return
     if not OPENAI_API_KEY:
         raise RuntimeError("未配置千问API密钥")
+    parts = []
+    for delta in get_transport().stream(content, type=type, model=m):
+        parts.append(delta)
+        yield delta
+    text = "".join(parts)
+    if text:
+        _llm_cache_put(key, text, m, type)
+
+
+def fits_single_call(content, type=None, model=None):
+    """
+    内容是否在单次调用的 token 预算之内
+    """
+    return estimate_tokens(content, model) <= context_budget(model, type)
+
+
+def call_qwen_api_many(contents, type=None, model=None, max_workers=None):
+    """
+    并发调用千问API，结果顺序与输入一致
+    
+    总耗时接近最慢的一段而不是各段之和；单段失败不影响其他段。
+    
+    Args:
+        contents: 用户消息内容列表
+        type: 调用类型，同 call_qwen_api
+        model: 模型名称，默认 QWEN_MODEL
+        max_workers: 最大并发数，默认 LLM_MAX_CONCURRENCY
+    
+    Returns:
+        list: 每段一个 {"text": str 或 None, "error": str 或 None, "error_type": 错误类名或 None, "elapsed": 秒}
+    """
+    contents = list(contents)
+    if not contents:
+        return []
+    
+    def _one(content):
+        start = time.time()
+        try:
+            text = (call_qwen_api(content, type=type, model=model) or "").strip()
+            return {"text": text or None, "error": None if text else "模型返回为空",
+                    "error_type": None if text else "EmptyResponse", "elapsed": time.time() - start}
+        except Exception as e:
+            return {"text": None, "error": str(e), "error_type": e.__class__.__name__, "elapsed": time.time() - start}
+    
+    workers = max(1, min(int(max_workers or LLM_MAX_CONCURRENCY), len(contents)))
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(_one, contents))
+
+
+def failure_marker(index, error_type):
+    """
+    第 index 段（从 0 开始）失败时在提示中的标记
+    
+    报告会发布到 Notion，标记只包含序号与错误类名；错误详情（可能含请求地址、响应内容）只打印到日志。
+    """
+    return LLM_FAILURE_MARKER.format(index=index + 1, error_type=error_type or "Error")
+
+
+def failure_notice(markers, total):
+    """
+    报告开头列出失败分段的一行提示
+    
+    各分段经逐层合并后已无法对应到报告中的具体位置，因此统一在开头提示，读者不会把缺失的部分当作没有内容。
+    """
+    return LLM_FAILURE_NOTICE.format(total=total, markers="、".join(markers))
+
+
+def _model_lookup(table, model, default):
+    m = model or QWEN_MODEL
+    return next((v for k, v in table.items() if m.startswith(k)), default)
+
+
+def estimate_tokens(text, model=None):
+    """
+    按模型的分词特点估算 token 数（汉字、英文字母、数字与标点的每字符 token 数差异很大）
+    """
+    if not text:
+        return 0
+    cjk_rate, ascii_rate, symbol_rate = _model_lookup(MODEL_TOKEN_RATES, model, DEFAULT_TOKEN_RATES)
+    cjk = len(_CJK_PATTERN.findall(text))
+    ascii_count = len(text.encode("ascii", "ignore"))
+    symbols = len(_ASCII_SYMBOL_PATTERN.findall(text))
+    other = len(text) - cjk - ascii_count
+    return int(cjk * cjk_rate + (ascii_count - symbols) * ascii_rate + symbols * symbol_rate + other) + 1
+
+
+def context_window(model=None):
+    """
+    模型的上下文窗口（token）
+    """
+    if LLM_CONTEXT_TOKENS > 0:
+        return LLM_CONTEXT_TOKENS
+    return _model_lookup(MODEL_CONTEXT_TOKENS, model, DEFAULT_CONTEXT_TOKENS)
+
+
+def context_budget(model=None, type=None, output_tokens=None):
+    """
+    单次调用可用于用户消息的 token 预算：窗口的 LLM_CONTEXT_FILL 减去系统提示词与输出预留
+    
+    Args:
+        model: 模型名称，默认 QWEN_MODEL
+        type: 调用类型，用于确定系统提示词
+        output_tokens: 输出预留，默认 LLM_MAX_OUTPUT_TOKENS
+    """
     m = model or QWEN_MODEL
-    if type == "MKT_TRANS" and ("qwen-mt" in (m or "")):
-        url_mt = "https://dashscope.aliyuncs.com/compatible-mode/v1/chat/completions"
-        headers_mt = {
+    output = LLM_MAX_OUTPUT_TOKENS if output_tokens is None else output_tokens
+    system = estimate_tokens(_system_prompt(type, m), m)
+    # 16 个 token 预留给消息格式开销
+    return max(int(context_window(m) * LLM_CONTEXT_FILL) - system - output - 16, 256)
+
+
+def translation_budget(model=None):
+    """
+    翻译调用的输入预算：译文长度与原文相当，输入与输出各占一半，且不超过输出上限
+    """
+    return max(min(context_budget(model, "MKT_TRANS", output_tokens=0) // 2, LLM_MAX_OUTPUT_TOKENS), 64)
+
+
+def _first_piece(text, limit):
+    """
+    按 split_text 的规则切出不超过 limit 个字符的第一段
+    """
+    if len(text) <= limit:
+        return text
+    return block_compiler.split_text(text[:limit + 1], limit)[0]
+
+
+def _split_to_budget(text, budget, model):
+    """
+    将估算超出预算的单条文本按标点切开，返回 [(片段, token数)]
+    
+    汉字与英文混排时各部分的 token 密度不同，不能按整条文本的平均比例切分：
+    每段切出后都重新估算，超出预算就按该段自身的比例继续缩短，保证每段都不超出预算。
+    """
+    pieces = []
+    rest = text
+    while rest:
+        tokens = estimate_tokens(rest, model)
+        if tokens <= budget:
+            pieces.append((rest, tokens))
+            break
+        piece = _first_piece(rest, max(int(len(rest) * budget / tokens), 1))
+        piece_tokens = estimate_tokens(piece, model)
+        while piece_tokens > budget and len(piece) > 1:
+            piece = _first_piece(piece, max(int(len(piece) * budget / piece_tokens * 0.9), 1))
+            piece_tokens = estimate_tokens(piece, model)
+        pieces.append((piece, piece_tokens))
+        rest = rest[len(piece):]
+    return pieces
+
+
+def pack_chunks(items, budget=None, header="", model=None, type=None):
+    """
+    按优先级顺序将条目装入分段，每段尽量填满 token 预算且不超出
+    
+    Args:
+        items: 文本条目序列（可为生成器），越靠前越重要
+        budget: 每段的 token 预算（含 header），默认 context_budget(model, type)
+        header: 每段开头的说明文字
+        model: 模型名称，用于估算 token
+        type: 调用类型，用于计算默认预算
+    
+    Returns:
+        list: 分段文本
+    """
+    budget = budget or context_budget(model, type)
+    header_tokens = estimate_tokens(header, model)
+    room = max(budget - header_tokens, 1)
+    chunks = []
+    current = []
+    size = header_tokens
+    for item in items:
+        tokens = estimate_tokens(item, model)
+        pieces = [(item, tokens)] if tokens <= room else _split_to_budget(item, room, model)
+        for piece, piece_tokens in pieces:
+            if current and size + piece_tokens + 1 > budget:
+                chunks.append(header + "\n".join(current))
+                current = []
+                size = header_tokens
+            current.append(piece)
+            size += piece_tokens + 1
+    if current:
+        chunks.append(header + "\n".join(current))
+    return chunks
+
+
+REDUCE_PROMPT = (
+    "以下是同一天的资讯按时间分段后分别得到的 {count} 份分析报告。请将它们合并为一份完整的报告："
+    "严格沿用系统提示词要求的结构与格式，合并重复的事件与观点，保留全部关键信息与数据，不要逐份罗列。\n\n"
+)
+_REDUCE_SEPARATOR = "\n\n---\n\n"
+
+
+def _reduce_base(model):
+    """
+    合并调用中除各份报告之外的 token 开销
+    """
+    return estimate_tokens(REDUCE_PROMPT, model) + 8
+
+
+def _reduce_groups(partials, budget, model):
+    """
+    将分段结果按顺序分组，每组不超过 token 预算；单独放不下其他报告的一份自成一组
+    """
+    base = _reduce_base(model)
+    groups = []
+    current = []
+    size = base
+    for text in partials:
+        tokens = estimate_tokens(text, model) + 4
+        if current and size + tokens > budget:
+            groups.append(current)
+            current = []
+            size = base
+        current.append(text)
+        size += tokens
+    if current:
+        groups.append(current)
+    return groups
+
+
+def _reduce(partials, type, model, budget, max_workers):
+    """
+    逐层合并分段分析，直到只剩一份
+    
+    只有一份的组直接进入下一层；某组合并失败时将该组原文按预算重新装填后向上传递。
+    某一层无法再减少份数（预算内放不下两份，或合并持续失败）时按顺序拼接返回。
+    """
+    level = 1
+    while len(partials) > 1:
+        groups = _reduce_groups(partials, budget, model)
+        pending = [g for g in groups if len(g) > 1]
+        if not pending:
+            print("⚠️ 预算内无法继续合并，按顺序拼接各份报告")
+            break
+        contents = [REDUCE_PROMPT.format(count=len(g)) + _REDUCE_SEPARATOR.join(g) for g in pending]
+        print(f"🧩 第 {level} 层合并：{len(partials)} 份 -> {len(groups)} 份")
+        results = iter(call_qwen_api_many(contents, type=type, model=model, max_workers=max_workers))
+        merged = []
+        for group in groups:
+            if len(group) == 1:
+                merged.extend(group)
+                continue
+            r = next(results)
+            if r["text"]:
+                merged.append(r["text"])
+            else:
+                print(f"⚠️ 合并失败，保留原分段: {r['error']}")
+                merged.extend(pack_chunks(group, budget - _reduce_base(model) - 4, model=model))
+        if len(merged) >= len(partials):
+            partials = merged
+            print("⚠️ 合并未能减少份数，按顺序拼接各份报告")
+            break
+        partials = merged
+        level += 1
+    return _REDUCE_SEPARATOR.join(partials)
+
+
+def map_reduce_summary(items, type=None, model=None, header="", max_workers=None, budget=None):
+    """
+    分段并行分析（map）后逐层合并为一份报告（reduce）
+    
+    每段按模型的 token 预算装填（约占上下文窗口的 LLM_CONTEXT_FILL），
+    无论当天有多少条目，单次调用都不会超出窗口；只有一段时直接调用一次模型。
+    
+    Args:
+        items: 文本条目序列，按重要性或时间排好序
+        type: 调用类型，同 call_qwen_api（合并时沿用同一系统提示词）
+        model: 模型名称，默认 QWEN_MODEL
+        header: 每个分段开头的说明文字
+        max_workers: 最大并发数，默认 LLM_MAX_CONCURRENCY
+        budget: 可选，每段的 token 预算，默认 context_budget(model, type)
+    
+    Returns:
+        str: 合并后的报告，有分段失败时开头一行列出失败的分段；所有分段都失败时返回 None
+    """
+    budget = budget or context_budget(model, type)
+    chunks = pack_chunks(items, budget, header, model)
+    if not chunks:
+        return None
+    if len(chunks) == 1:
+        return (call_qwen_api(chunks[0], type=type, model=model) or "").strip() or None
+    print(f"🧩 内容共 {len(chunks)} 段（每段约 {budget} token），开始并行分段分析...")
+    results = call_qwen_api_many(chunks, type=type, model=model, max_workers=max_workers)
+    partials = [r["text"] for r in results if r["text"]]
+    markers = []
+    for i, r in enumerate(results):
+        if not r["text"]:
+            print(f"⚠️ 第 {i + 1}/{len(results)} 段分析失败: {r['error']}")
+            markers.append(failure_marker(i, r["error_type"]))
+    if not partials:
+        return None
+    report = _reduce(partials, type, model, budget, max_workers)
+    if markers:
+        report = failure_notice(markers, len(results)) + "\n\n" + report
+    return report
+
+
+RETRYABLE_STATUS = (429, 500, 502, 503, 504)
+
+
+def _stream_finished(finish_reason):
+    """
+    流式输出是否已正常结束（生成完毕或达到 max_tokens）；中途出错或连接断开时没有结束标记
+    """
+    return finish_reason in ("stop", "length")
+
+
+def _retry_delay(retry_after, attempt):
+    """
+    重试间隔：有 Retry-After（秒数或 HTTP 日期）时遵循它，否则指数退避并在后半段随机抖动，
+    避免并发请求在同一时刻集中重试
+    """
+    if retry_after:
+        try:
+            delay = float(retry_after)
+        except (TypeError, ValueError):
+            try:
+                delay = email.utils.parsedate_to_datetime(retry_after).timestamp() - time.time()
+            except (TypeError, ValueError):
+                delay = None
+        if delay is not None:
+            return min(max(delay, 0.0), LLM_RETRY_MAX_DELAY) + random.uniform(0, 0.5)
+    cap = min(LLM_RETRY_MAX_DELAY, 2 ** attempt)
+    return cap / 2 + random.uniform(0, cap / 2)
+
+
+class _RetryableCall(Exception):
+    def __init__(self, error, retry_after=None):
+        super().__init__(str(error))
+        self.error = error
+        self.retry_after = retry_after
+
+
+class LatencyTracker:
+    """
+    按 (模型, 调用类型) 记录每次尝试的耗时，用历史分位数作为对冲阈值；
+    样本写入本地缓存目录，随缓存在多次运行之间累积
+    """
+
+    def __init__(self, name=LLM_LATENCY_FILE, max_samples=LLM_LATENCY_SAMPLES):
+        self.name = name
+        self.max_samples = max_samples
+        self.samples = local_store.load_json(name, {}) or {}
+        self.stats = {"attempts": 0, "timeouts": 0, "errors": 0, "hedged": 0, "hedge_wins": 0}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(model, type):
+        return f"{model}|{type or 'SUMMARY'}"
+
+    def record(self, model, type, elapsed, ok=True):
+        """
+        记录一次尝试的耗时；超时的尝试按已等待的时长记入（真实耗时只会更长）
+        """
+        key = self._key(model, type)
+        elapsed = round(elapsed, 3)
+        with self._lock:
+            self.stats["attempts"] += 1
+            if not ok:
+                self.stats["timeouts"] += 1
+            samples = self.samples.setdefault(key, [])
+            samples.append(elapsed)
+            del samples[:-self.max_samples]
+
+        def _update(data):
+            data = data or {}
+            saved = data.setdefault(key, [])
+            saved.append(elapsed)
+            del saved[:-self.max_samples]
+            return data
+        local_store.update_json(self.name, _update, {})
+
+    def count(self, name):
+        with self._lock:
+            self.stats[name] = self.stats.get(name, 0) + 1
+
+    def percentile(self, model, type, p):
+        """
+        历史耗时的第 p 分位数，无样本时返回 None
+        """
+        with self._lock:
+            samples = sorted(self.samples.get(self._key(model, type)) or [])
+        if not samples:
+            return None
+        index = min(len(samples) - 1, max(0, math.ceil(p / 100 * len(samples)) - 1))
+        return samples[index]
+
+    def threshold(self, model, type):
+        """
+        对冲阈值：样本足够时取 LLM_HEDGE_PERCENTILE 分位，否则使用默认值；
+        不低于 LLM_HEDGE_MIN_SECONDS，也不超过单次请求超时
+        """
+        with self._lock:
+            enough = len(self.samples.get(self._key(model, type)) or []) >= _HEDGE_MIN_SAMPLES
+        value = self.percentile(model, type, LLM_HEDGE_PERCENTILE) if enough else LLM_HEDGE_DEFAULT_SECONDS
+        return min(max(value, LLM_HEDGE_MIN_SECONDS), LLM_TIMEOUT)
+
+
+class QwenTransport:
+    """
+    长期复用的千问调用通道：启动时确定一次使用 SDK 还是 HTTP，
+    保持连接池会话，并按 (调用类型, 模型) 缓存预先构造的请求模板
+    """
+
+    def __init__(self, api_key, mode=None):
+        self.api_key = api_key
+        self.mode = (mode or LLM_TRANSPORT).lower()
+        self._generation = None
+        if self.mode in ("auto", "sdk"):
+            try:
+                from dashscope import Generation
+                self._generation = Generation
+                self.mode = "sdk"
+            except Exception:
+                self.mode = "http"
+        else:
+            self.mode = "http"
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=2, pool_maxsize=max(LLM_MAX_CONCURRENCY, 1) * 2)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.headers.update({
             "Content-Type": "application/json",
-            "Authorization": f"Bearer {OPENAI_API_KEY}"
-        }
-        payload_mt = {
-            "model": m,
-            "messages": [{"role": "user", "content": content}],
-            "extra_body": {
-                "translation_options": {
-                    "source_lang": "auto",
-                    "target_lang": "Chinese"
-                }
+            "Authorization": f"Bearer {api_key}",
+        })
+        self._templates = {}
+        self._lock = threading.Lock()
+        self._backoff_until = 0.0
+
+    def _template(self, type, model):
+        """
+        预先构造的请求模板：系统消息、参数等每次调用都相同的部分
+        """
+        key = (type, model)
+        template = self._templates.get(key)
+        if template is None:
+            system = {"role": "system", "content": _system_prompt(type, model)}
+            params = _generation_params(type, model)
+            template = {
+                "system": system,
+                "http": {"model": model, "parameters": params},
+                "mt": {"model": model, "extra_body": params},
             }
-        }
-        last_err_mt = None
-        for attempt in range(3):
+            with self._lock:
+                self._templates[key] = template
+        return template
+
+    def _back_off(self, seconds):
+        """
+        记录限流或退避等待的截止时间，此前不发出对冲请求
+        """
+        with self._lock:
+            self._backoff_until = max(self._backoff_until, time.monotonic() + seconds)
+
+    def _backing_off(self):
+        return time.monotonic() < self._backoff_until
+
+    def _attempt(self, url, data, parse, model, type=None):
+        """
+        发送一次请求并记录耗时（成功或超时计入耗时样本，其他失败只计数）；
+        429/5xx 与网络错误抛出 _RetryableCall，其他错误直接抛出
+        """
+        tracker = get_latency_tracker()
+        start = time.monotonic()
+        try:
+            r = self.session.post(url, data=data, timeout=LLM_TIMEOUT)
+        except requests.exceptions.Timeout as e:
+            tracker.record(model, type, time.monotonic() - start, ok=False)
+            raise _RetryableCall(e)
+        except requests.exceptions.RequestException as e:
+            tracker.count("errors")
+            raise _RetryableCall(e)
+        if r.status_code == 200:
+            tracker.record(model, type, time.monotonic() - start)
+            return parse(r.json())
+        tracker.count("errors")
+        error = Exception(f"API调用失败: {r.status_code}, {r.text}")
+        if r.status_code not in RETRYABLE_STATUS:
+            raise error
+        raise _RetryableCall(error, r.headers.get("Retry-After"))
+
+    def _post(self, url, payload, parse, model, type=None):
+        """
+        发送请求，对 429/5xx 与网络错误按退避策略重试，其他错误直接抛出；
+        每次尝试单独对冲（见 _hedged），退避等待期间不会发出对冲请求
+        """
+        data = json.dumps(payload)
+        last_err = None
+        for attempt in range(LLM_RETRIES):
             try:
-                r = requests.post(url_mt, headers=headers_mt, data=json.dumps(payload_mt), timeout=60)
-                if r.status_code != 200:
-                    if r.status_code in (429, 500, 503) and attempt < 2:
-                        time.sleep(1 + attempt)
-                        continue
-                    raise Exception(f"API调用失败: {r.status_code}, {r.text}")
-                js = r.json()
-                choices = (js.get("choices") or [])
-                if choices:
-                    msg = choices[0].get("message") or {}
-                    return msg.get("content") or ""
-                return ""
-            except Exception as e:
-                last_err_mt = e
-                if attempt < 2:
-                    time.sleep(1 + attempt)
-                    continue
-                raise last_err_mt
-    # 优先尝试 SDK
-    try:
-        from dashscope import Generation
-        contentPrompt = (
-            MKT_SYSTEM_PROMPT if type == "MKT" else KX_SYSTEM_PROMPT if type == "KX" else (
-                "将以下英文新闻逐条精准翻译为中文。仅翻译，不添加任何分析或拓展，保留段落结构，逐条输出，以【标题】起始并跟随正文。" if type == "MKT_TRANS" else ANALYST_SYSTEM_PROMPT
-            )
-        )
-        resp = Generation.call(
-            model=m,
-            messages=[
-                {"role": "system", "content": contentPrompt},
-                {"role": "user", "content": content},
-            ],
-            api_key=OPENAI_API_KEY,
+                return self._hedged(lambda: self._attempt(url, data, parse, model, type), model, type)
+            except _RetryableCall as e:
+                last_err = e.error
+                retry_after = e.retry_after
+            if attempt < LLM_RETRIES - 1:
+                delay = _retry_delay(retry_after, attempt)
+                self._back_off(delay)
+                print(f"⚠️ 千问API第 {attempt + 1} 次请求失败，{delay:.1f}s 后重试: {last_err}")
+                time.sleep(delay)
+        raise last_err
+
+    def _call_mt(self, content, model):
+        """
+        qwen-mt 翻译模型走兼容模式接口，不带系统提示词
+        """
+        payload = dict(self._template("MKT_TRANS", model)["mt"])
+        payload["messages"] = [{"role": "user", "content": content}]
+
+        def _parse(js):
+            choices = js.get("choices") or []
+            if choices:
+                return (choices[0].get("message") or {}).get("content") or ""
+            return ""
+        return self._post(QWEN_COMPATIBLE_URL, payload, _parse, model, "MKT_TRANS")
+
+    def _call_sdk(self, content, template, model):
+        resp = self._generation.call(
+            model=model,
+            messages=[template["system"], {"role": "user", "content": content}],
+            api_key=self.api_key,
         )
         # SDK 通常提供 output_text，或 output.choices[0].message.content
         text = getattr(resp, "output_text", None)
@@ -508,58 +1191,247 @@ def call_qwen_api(content, type=None, model=None):
             choices = out.get("choices") or []
             if choices:
                 text = (choices[0].get("message") or {}).get("content") or choices[0].get("text")
-        if text:
-            return text
-    except Exception:
-        pass
-
-    # 回退到 HTTP
-    url = "https://dashscope.aliyuncs.com/api/v1/services/aigc/text-generation/generation"
-    headers = {
-        "Content-Type": "application/json",
-        "Authorization": f"Bearer {OPENAI_API_KEY}"
-    }
-    contentPrompt = (
-        MKT_SYSTEM_PROMPT if type == "MKT" else KX_SYSTEM_PROMPT if type == "KX" else (
-            "将以下英文新闻逐条精准翻译为中文。仅翻译，不添加任何分析或拓展，保留段落结构，逐条输出，以【标题】起始并跟随正文。" if type == "MKT_TRANS" else ANALYST_SYSTEM_PROMPT
-        )
-    )
-    m = model or QWEN_MODEL
-    payload = {
-        "model": m,
-        "input": {
-            "messages": [
-                {"role": "system", "content": contentPrompt},
-                {"role": "user", "content": content},
-            ]
-        },
-        "parameters": {
-            "temperature": 0.7,
-            "max_tokens": 2000,
-            "result_format": "message"
-        }
-    }
-    last_err = None
-    for attempt in range(3):
-        try:
-            r = requests.post(url, headers=headers, data=json.dumps(payload), timeout=60)
-            if r.status_code != 200:
-                if r.status_code in (429, 500, 503) and attempt < 2:
-                    time.sleep(1 + attempt)
-                    continue
-                raise Exception(f"API调用失败: {r.status_code}, {r.text}")
-            js = r.json()
+        return text
+
+    def _call_http(self, content, template, type=None):
+        payload = dict(template["http"])
+        payload["input"] = {"messages": [template["system"], {"role": "user", "content": content}]}
+
+        def _parse(js):
             out = js.get("output", {})
             choices = out.get("choices") or []
             if choices:
                 return (choices[0].get("message") or {}).get("content") or choices[0].get("text") or ""
             return out.get("text") or ""
-        except Exception as e:
-            last_err = e
-            if attempt < 2:
-                time.sleep(1 + attempt)
+        return self._post(QWEN_GENERATION_URL, payload, _parse, payload["model"], type)
+
+    def _call_once(self, content, type, model):
+        """
+        调用一次模型（SDK 模式下失败或返回为空时回退 HTTP）
+        """
+        if type == "MKT_TRANS" and "qwen-mt" in model:
+            return self._call_mt(content, model)
+        template = self._template(type, model)
+        if self.mode == "sdk":
+            try:
+                return self._hedged(lambda: self._attempt_sdk(content, template, model, type), model, type)
+            except Exception:
+                pass
+        return self._call_http(content, template, type)
+
+    def _attempt_sdk(self, content, template, model, type):
+        """
+        通过 SDK 调用一次并记录耗时，返回为空时抛出异常（由调用方回退 HTTP）
+        """
+        start = time.monotonic()
+        text = self._call_sdk(content, template, model)
+        if not text:
+            get_latency_tracker().count("errors")
+            raise Exception("SDK 返回为空")
+        get_latency_tracker().record(model, type, time.monotonic() - start)
+        return text
+
+    def _hedged(self, fn, model, type):
+        """
+        对冲单次尝试：未开启 LLM_HEDGE 时直接执行；否则超过阈值仍未返回就再发一份相同请求，
+        取先成功返回的结果
+        
+        到达阈值时若正处于限流或退避等待中，则不对冲、继续等待原请求；第一份请求在阈值之前
+        失败时不再对冲（由调用方决定是否退避重试）；两份都失败时抛出最后的异常。
+        被放弃的请求在后台线程中自行结束（受 LLM_TIMEOUT 限制），其耗时仍计入统计。
+        """
+        if not LLM_HEDGE:
+            return fn()
+        tracker = get_latency_tracker()
+        deadline = tracker.threshold(model, type)
+        results = queue.Queue()
+
+        def _run(index):
+            try:
+                results.put((index, True, fn()))
+            except Exception as e:
+                results.put((index, False, e))
+
+        threading.Thread(target=_run, args=(0,), daemon=True).start()
+        launched, received, error = 1, 0, None
+        while received < launched:
+            try:
+                index, ok, value = results.get(timeout=deadline)
+            except queue.Empty:
+                deadline = None
+                if self._backing_off():
+                    print(f"⏱️ {model} 超过阈值未返回，但正在限流退避，不发出对冲请求")
+                    continue
+                print(f"⏱️ {model} 超过阈值未返回，发出对冲请求")
+                tracker.count("hedged")
+                threading.Thread(target=_run, args=(1,), daemon=True).start()
+                launched += 1
                 continue
-            raise last_err
+            received += 1
+            if ok:
+                if index == 1:
+                    tracker.count("hedge_wins")
+                    print(f"⚡ 对冲请求先返回（{model}）")
+                return value
+            error = value
+        raise error
+
+    def call(self, content, type=None, model=None):
+        """
+        调用一次模型；开启 LLM_HEDGE 时每次尝试按历史耗时分位对冲慢请求
+        """
+        return self._call_once(content, type, model or QWEN_MODEL)
+
+    def _stream_sdk(self, content, template, model):
+        responses = self._generation.call(
+            model=model,
+            messages=[template["system"], {"role": "user", "content": content}],
+            api_key=self.api_key,
+            stream=True,
+            result_format="message",
+            incremental_output=True,
+        )
+        finished = False
+        for resp in responses:
+            status = getattr(resp, "status_code", 200)
+            if status != 200:
+                raise Exception(f"API调用失败: {status}, {getattr(resp, 'code', '')} {getattr(resp, 'message', '')}")
+            out = getattr(resp, "output", {}) or {}
+            choices = out.get("choices") or []
+            if choices:
+                delta = (choices[0].get("message") or {}).get("content") or ""
+                finished = finished or _stream_finished(choices[0].get("finish_reason"))
+            else:
+                delta = out.get("text") or ""
+                finished = finished or _stream_finished(out.get("finish_reason"))
+            if delta:
+                yield delta
+        if not finished:
+            raise Exception("流式输出未正常结束")
+
+    def _stream_http(self, content, template, type=None):
+        """
+        SSE 流式调用（incremental_output 模式下每个事件只包含新增的文本）
+        
+        建立连接的重试与 _post 相同；收到响应头的耗时按 "调用类型:stream" 单独计入统计。
+        """
+        payload = dict(template["http"])
+        payload["parameters"] = dict(payload["parameters"], incremental_output=True)
+        payload["input"] = {"messages": [template["system"], {"role": "user", "content": content}]}
+        headers = {"X-DashScope-SSE": "enable", "Accept": "text/event-stream"}
+        data = json.dumps(payload)
+        tracker = get_latency_tracker()
+        key = f"{type or 'SUMMARY'}:stream"
+        for attempt in range(LLM_RETRIES):
+            retry_after = None
+            start = time.monotonic()
+            try:
+                r = self.session.post(QWEN_GENERATION_URL, data=data, headers=headers, stream=True, timeout=LLM_TIMEOUT)
+            except requests.exceptions.Timeout as e:
+                tracker.record(payload["model"], key, time.monotonic() - start, ok=False)
+                last_err = e
+            except requests.exceptions.RequestException as e:
+                tracker.count("errors")
+                last_err = e
+            else:
+                if r.status_code == 200:
+                    tracker.record(payload["model"], key, time.monotonic() - start)
+                    break
+                tracker.count("errors")
+                last_err = Exception(f"API调用失败: {r.status_code}, {r.text}")
+                r.close()
+                if r.status_code not in RETRYABLE_STATUS:
+                    raise last_err
+                retry_after = r.headers.get("Retry-After")
+            if attempt == LLM_RETRIES - 1:
+                raise last_err
+            delay = _retry_delay(retry_after, attempt)
+            self._back_off(delay)
+            print(f"⚠️ 千问API第 {attempt + 1} 次流式请求失败，{delay:.1f}s 后重试: {last_err}")
+            time.sleep(delay)
+        finished = False
+        with r:
+            # SSE 规定为 UTF-8；requests 对未声明字符集的 text/* 响应按 ISO-8859-1 解码，会产生乱码，
+            # 且 str.splitlines 会在 \x85 等字符处断行，因此按字节分行后逐行以 UTF-8 解码
+            for raw in r.iter_lines():
+                line = raw.decode("utf-8")
+                if not line or not line.startswith("data:"):
+                    continue
+                js = json.loads(line[5:].strip())
+                if js.get("code") and not js.get("output"):
+                    raise Exception(f"API调用失败: {js.get('code')}, {js.get('message')}")
+                out = js.get("output", {})
+                choices = out.get("choices") or []
+                if choices:
+                    delta = (choices[0].get("message") or {}).get("content") or choices[0].get("text") or ""
+                    finished = finished or _stream_finished(choices[0].get("finish_reason"))
+                else:
+                    delta = out.get("text") or ""
+                    finished = finished or _stream_finished(out.get("finish_reason"))
+                if delta:
+                    yield delta
+        if not finished:
+            raise Exception("流式输出未正常结束")
+
+    def stream(self, content, type=None, model=None):
+        """
+        流式调用模型，逐段产出新生成的文本
+        
+        SDK 模式下在产出任何文本之前失败时回退 HTTP；qwen-mt 翻译不支持流式，整段产出。
+        """
+        m = model or QWEN_MODEL
+        if type == "MKT_TRANS" and "qwen-mt" in m:
+            yield self._call_mt(content, m)
+            return
+        template = self._template(type, m)
+        if self.mode == "sdk":
+            started = False
+            try:
+                for delta in self._stream_sdk(content, template, m):
+                    started = True
+                    yield delta
+                if started:
+                    return
+            except Exception:
+                if started:
+                    raise
+        yield from self._stream_http(content, template, type)
+
+
+_transport = None
+_transport_lock = threading.Lock()
+_latency_tracker = None
+
+
+def get_transport():
+    """
+    获取共享的调用通道（首次调用时创建）
+    """
+    global _transport
+    with _transport_lock:
+        if _transport is None:
+            _transport = QwenTransport(OPENAI_API_KEY)
+        return _transport
+
+
+def get_latency_tracker():
+    """
+    获取共享的耗时统计（首次调用时创建）
+    """
+    global _latency_tracker
+    with _transport_lock:
+        if _latency_tracker is None:
+            _latency_tracker = LatencyTracker()
+        return _latency_tracker
+
+
+def _call_qwen_api(content, type=None, model=None):
+    """
+    调用千问API生成总结（通过共享的调用通道，优先使用DashScope SDK，其次HTTP）
+    """
+    if not OPENAI_API_KEY:
+        raise RuntimeError("未配置千问API密钥")
+    return get_transport().call(content, type=type, model=model)
 
 
 def generate_summary(ideas, idea_retriever):
@@ -576,27 +1448,17 @@ def generate_summary(ideas, idea_retriever):
     if not ideas:
         return "过去30天没有想法记录"
     
-    # 收集所有想法的内容
-    idea_texts = []
-    for idea in ideas:
-        title = idea_retriever.get_idea_title(idea)
-        description = idea_retriever.get_idea_description(idea)
-        content = idea_retriever.get_idea_content(idea)
-        
-        idea_text = f"标题：{title}"
-        if description:
-            idea_text += f"\n描述：{description}"
-        if content:
-            idea_text += f"\n内容：{content}"
-        
-        idea_texts.append(idea_text)
+    # 收集所有想法的内容（并发获取，本次运行已拉取过的正文直接复用）
+    idea_texts = idea_retriever.fetch_idea_texts(ideas)
     
     # 合并所有想法内容
     full_text = "\n---\n".join(idea_texts)
     
     try:
         # 调用千问API
-        summary = call_qwen_api(full_text)
+        summary = map_reduce_summary([full_text])
+        if not summary:
+            raise RuntimeError("模型返回为空")
         return summary
     except Exception as e:
         print(f"❌ 调用千问API失败: {e}")
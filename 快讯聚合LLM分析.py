@@ -202,12 +202,10 @@ def main():
     api_key = (OPENAI_API_KEY or "").strip()
     if api_key and collected_texts:
         print(f"正在使用千问生成快讯分析，共 {len(collected_texts)} 条...")
-        full_context = "\n".join(collected_texts)
-        if len(full_context) > 100000:
-            full_context = full_context[:100000] + "\n...(截断)..."
         try:
             import summary_generator
-            out = summary_generator.call_qwen_api(full_context, type="KX")
+            # 按模型的 token 预算装填；超出单次上下文时分段并行分析再合并，不再截断较早的快讯
+            out = summary_generator.map_reduce_summary(collected_texts, type="KX")
             global report
             report = (out or "").strip()
         except Exception as e: